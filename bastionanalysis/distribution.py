@@ -4,7 +4,6 @@ from pathlib import Path
 import re
 import sys
 from manim import *
-import math
 import pandas as pd
 import os
 
@@ -12,6 +11,7 @@ ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 
 from rankedutils import db
+from videoutils import histogram
 
 X_MIN = 1
 X_MAX = 6
@@ -23,25 +23,15 @@ BASTIONS = ["bridge", "housing", "stables", "treasure"]
 class Plot(Scene):
 
     def construct(self):
-        bastion_times = {}
-        medians = {}
-        median_classes = {}
-        histogram = {
-            "bridge": [0] * CLASSES,
-            "housing": [0] * CLASSES,
-            "stables": [0] * CLASSES,
-            "treasure": [0] * CLASSES,
-        }
         with open(ROOT_DIR / "bastionanalysis" / "data" / "bastion_splits.json") as f:
             bastion_times = json.load(f)
-            for bastion in bastion_times:
-                for time in bastion_times[bastion]:
-                    time = time / 60000
-                    time_class = math.floor((time - X_MIN) / STEP)
-                    if 0 <= time_class < CLASSES:
-                        histogram[bastion][time_class] += 1
-                medians[bastion] = np.median(bastion_times[bastion]) / 60000
-                median_classes[bastion] = math.floor((medians[bastion] - X_MIN) / STEP)
+        summaries = histogram.batch(
+            {bastion: bastion_times[bastion] for bastion in BASTIONS},
+            X_MIN * 60000,
+            STEP * 60000,
+            CLASSES,
+            percentiles=[10, 90],
+        )
 
         title_top = Text(
             "Distribution of",
@@ -56,7 +46,7 @@ class Plot(Scene):
         charts = [
             BarChart(
                 bar_names=[f"{digital_time(i * STEP + X_MIN)}" if i % (0.5 / STEP) == 0 else ""  for i in range(CLASSES)],
-                values=histogram[bastion],
+                values=summaries[bastion]["counts"].tolist(),
                 y_range=[0, 75, 10],
                 axis_config={"font_size": 20},
                 x_axis_config={
@@ -79,12 +69,12 @@ class Plot(Scene):
         for i, chart in enumerate(charts):
             i = i % 4
             bars = chart.bars
-            median_bar = bars[median_classes[BASTIONS[i]]]
+            summary = summaries[BASTIONS[i]]
+            median_bar = bars[summary["median_class"]]
             bastion_name = BASTIONS[charts.index(chart)].capitalize()
 
-            highroll = np.percentile(bastion_times[BASTIONS[i]], 10) / 60000
-            median = medians[BASTIONS[i]]
-            lowroll = np.percentile(bastion_times[BASTIONS[i]], 90) / 60000
+            highroll, lowroll = np.array(summary["percentiles"]) / 60000
+            median = summary["median"] / 60000
             std = np.std(bastion_times[BASTIONS[i]]) / 60000
 
             highroll_txt = Text(f"Highroll: {digital_time(highroll)}\n", font_size=18)
@@ -1,4 +1,6 @@
+from concurrent.futures import ProcessPoolExecutor
 import json
+import multiprocessing
 import numpy as np
 from pathlib import Path
 import sys
@@ -7,182 +9,155 @@ ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 
 from rankedutils import db
+from videoutils import query, ranks, segments, timelines
 
 BASTIONS = ["bridge", "housing", "stables", "treasure"]
-RANKS = ["coal", "iron", "gold", "emerald", "diamond", "netherite"]
-TIME_PATTERN = r"^.*\s(\d:\d\d:\d\d)"
+RANKS = ranks.RANKS
+POST_BASTION = [
+    "nether.find_fortress",
+    "projectelo.timeline.blind_travel",
+    "story.follow_ender_eye",
+    "story.enter_the_end",
+]
 
 
-def process(bastion):
-    all_times = 0
-    all_comps = 0
-    all_deaths = 0
-    all_entries = 0
-    all_post_times = 0
-    all_comp_times = 0
-    all_comp_full = 0
-    rank_times = {"coal": 0, "iron": 0, "gold": 0, "emerald": 0, "diamond": 0, "netherite": 0}
-    rank_comps = {"coal": 0, "iron": 0, "gold": 0, "emerald": 0, "diamond": 0, "netherite": 0}
-    rank_deaths = {"coal": 0, "iron": 0, "gold": 0, "emerald": 0, "diamond": 0, "netherite": 0}
-    rank_death_opps = {"coal": 0, "iron": 0, "gold": 0, "emerald": 0, "diamond": 0, "netherite": 0}
-    rank_entries = {"coal": 0, "iron": 0, "gold": 0, "emerald": 0, "diamond": 0, "netherite": 0}
-    rank_post_times = {"coal": 0, "iron": 0, "gold": 0, "emerald": 0, "diamond": 0, "netherite": 0}
-    rank_comp_times = {"coal": 0, "iron": 0, "gold": 0, "emerald": 0, "diamond": 0, "netherite": 0}
-    rank_comp_full = {"coal": 0, "iron": 0, "gold": 0, "emerald": 0, "diamond": 0, "netherite": 0}
-    netherite_times = []
-    conn, cursor = db.start()
+FIELDS = ["times", "comps", "deaths", "death_opps", "entries", "post_times", "comp_times", "comp_full"]
+
+
+def empty_totals():
+    return {group: dict.fromkeys(FIELDS, 0) for group in ["all"] + RANKS}
+
+
+def find_shards():
+    # One shard per bastion and season, so every core gets a slice of each bastion
+    conn, cursor = query.connect()
+    cursor.execute("SELECT DISTINCT season FROM matches WHERE type = 2 ORDER BY season")
+    seasons = [season for season, in cursor.fetchall()]
+    return [(bastion, season) for bastion in BASTIONS for season in seasons]
+
+
+def process_shard(shard):
+    bastion, season = shard
+    totals = empty_totals()
+    conn, cursor = query.connect()
+    # The store is brought up to date once by main, workers only map it
+    store = timelines.TimelineStore(timelines.store_path())
     matches = db.query_db(
         cursor,
         items="id, result_uuid, time, forfeited",
         bastionType=bastion.upper(),
         type=2,
+        season=season,
         decayed=False,
     )
-    for match in matches:
-        runs = db.query_db(cursor, table="runs", items="eloRate, timeline, player_uuid", match_id=match[0])
-        for run in runs:
-            elo, timeline, uuid = run
-            time = match[2] if match[1] == uuid and not match[3] else None
-            total_time, deaths, completions, death_opps, entries, post_time, comp_time, full_comp, times = process_timeline(json.loads(timeline), time)
-            if elo:
-                rank = convert_to_rank(elo)
-                rank_times[rank] += total_time
-                rank_deaths[rank] += deaths
-                rank_comps[rank] += completions
-                rank_death_opps[rank] += death_opps
-                rank_entries[rank] += entries
-                rank_post_times[rank] += post_time
-                rank_comp_times[rank] += comp_time
-                rank_comp_full[rank] += full_comp
-                if rank == "netherite":
-                    netherite_times += times
-            all_times += total_time
-            all_comps += completions
-            all_deaths += deaths
-            all_death_opps += death_opps
-            all_entries += entries
-            all_post_times += post_time
-            all_comp_times += comp_time
-            all_comp_full += full_comp
-
-    print(rank_times)
-    print(rank_comps)
-    print(rank_deaths)
-    print(rank_death_opps)
+    rows = [
+        (match, elo, uuid)
+        for match, runs in query.iter_match_runs(cursor, matches, items="eloRate, player_uuid")
+        for elo, uuid in runs
+    ]
+    runs = store.find_runs([match[0] for match, _, _ in rows], [uuid for _, _, uuid in rows])
+    # Runs newer than the timeline store are left out
+    found = runs >= 0
+    rows = [row for row, run_found in zip(rows, found.tolist()) if run_found]
+    runs = runs[found]
+    positions, types, times = store.events(runs)
+    stats = segments.measure(
+        positions,
+        types,
+        times,
+        len(runs),
+        store.codes(["nether.find_bastion"]),
+        store.codes(POST_BASTION),
+        store.codes(["projectelo.timeline.reset"]),
+        store.codes(["projectelo.timeline.death"]),
+    )
+
+    match_times = np.array(
+        [match[2] or 0 if match[1] == uuid and not match[3] else 0 for match, _, uuid in rows], dtype=np.int64
+    )
+    opponent_ended = np.array([match[1] not in (None, uuid) and not match[3] for match, _, uuid in rows], dtype=bool)
+    full_comp = (match_times > 0) & (stats["exit"] > 0)
+    values = {
+        "times": stats["duration"],
+        "comps": stats["completions"],
+        "deaths": stats["deaths"],
+        "death_opps": stats["entries"] - (opponent_ended & stats["open"]),
+        "entries": stats["entries"],
+        "post_times": np.where(full_comp, match_times - stats["exit"], 0),
+        "comp_times": np.where(full_comp, match_times, 0),
+        "comp_full": full_comp.astype(np.int64),
+    }
+    rank_codes = ranks.classify([elo for _, elo, _ in rows], season)
+    ranked = rank_codes != ranks.UNRANKED
+    for field, column in values.items():
+        totals["all"][field] = int(column.sum())
+        for rank, total in zip(RANKS, np.bincount(rank_codes[ranked], weights=column[ranked], minlength=len(RANKS))):
+            totals[rank][field] = int(total)
+    netherite_times = stats["segment_times"][rank_codes[stats["segment_runs"]] == RANKS.index("netherite")].tolist()
+    return bastion, totals, netherite_times
+
+
+def merge(results):
+    # Every accumulator is a plain sum, so shards merge exactly in any order
+    totals = {bastion: empty_totals() for bastion in BASTIONS}
+    netherite_times = {bastion: [] for bastion in BASTIONS}
+    for bastion, shard_totals, shard_times in results:
+        for group, values in shard_totals.items():
+            for field, value in values.items():
+                totals[bastion][group][field] += value
+        netherite_times[bastion] += shard_times
+    return totals, netherite_times
+
+
+def summarise(totals, netherite_times):
+    for field in ["times", "comps", "deaths", "death_opps"]:
+        print({rank: totals[rank][field] for rank in RANKS})
+    all_totals = totals["all"]
     bastion_dict = {
-        "mean": int(all_times / all_comps),
-        "comps": all_comps,
-        "deaths": all_deaths,
-        "entries": all_entries,
-        "death_rate": round(all_deaths / all_entries, 3),
-        "post_mean": int(all_post_times / all_comp_full),
-        "comp_mean": int(all_comp_times / all_comp_full),
-        "rank_means": {rank: int(rank_times[rank] / rank_comps[rank]) for rank in RANKS},
-        "rank_death_rates": {rank: round(rank_deaths[rank] / rank_death_opps[rank], 3) for rank in RANKS},
-        "rank_post_means": {rank: int(rank_post_times[rank] / rank_comp_full[rank]) for rank in RANKS},
-        "rank_comp_means": {rank: int(rank_comp_times[rank] / rank_comp_full[rank]) for rank in RANKS},
+        "mean": int(all_totals["times"] / all_totals["comps"]),
+        "comps": all_totals["comps"],
+        "deaths": all_totals["deaths"],
+        "entries": all_totals["entries"],
+        "death_rate": round(all_totals["deaths"] / all_totals["entries"], 3),
+        "post_mean": int(all_totals["post_times"] / all_totals["comp_full"]),
+        "comp_mean": int(all_totals["comp_times"] / all_totals["comp_full"]),
+        "rank_means": {rank: int(totals[rank]["times"] / totals[rank]["comps"]) for rank in RANKS},
+        "rank_death_rates": {rank: round(totals[rank]["deaths"] / totals[rank]["death_opps"], 3) for rank in RANKS},
+        "rank_post_means": {rank: int(totals[rank]["post_times"] / totals[rank]["comp_full"]) for rank in RANKS},
+        "rank_comp_means": {rank: int(totals[rank]["comp_times"] / totals[rank]["comp_full"]) for rank in RANKS},
     }
     return bastion_dict, sorted(netherite_times)
 
 
-def process_timeline(timeline, time, opponent_ended):
-    deaths = 0
-    death_opps = 0
-    total_time = 0
-    entries = 0
-    completions = 0
-    post_bastion = [
-        "nether.find_fortress",
-        "projectelo.timeline.blind_travel",
-        "story.follow_ender_eye",
-        "story.enter_the_end",
-    ]
-    bastion_entry = 0
-    bastion_exit = 0
-    times = []
-    for event in reversed(timeline):
-        if event["type"] == "nether.find_bastion":
-            bastion_entry = event["time"]
-            entries += 1
-            death_opps += 1
-
-        elif event["type"] == "projectelo.timeline.reset":
-            bastion_entry = 0
-            bastion_exit = 0
-
-        elif bastion_entry and not bastion_exit:
-            if event["type"] == "projectelo.timeline.death":
-                deaths += 1
-
-            elif event["type"] in post_bastion:
-                bastion_exit = event["time"]
-                total_time += bastion_exit - bastion_entry
-                times.append(bastion_exit - bastion_entry)
-                completions += 1
-
-    else:
-        if opponent_ended and bastion_entry and not bastion_exit:
-            death_opps -= 1
-
-    if time and bastion_exit:
-        post_time = time - bastion_exit
-        full_comp = 1
-    else:
-        post_time = 0
-        full_comp = 0
-        time = 0
-
-    return total_time, deaths, completions, death_opps, entries, post_time, time, full_comp, times
-
-
-def convert_to_rank(elo):
-    if not elo:
-        return "unranked"
-    if elo < 600:
-        return "coal"
-    if elo < 900:
-        return "iron"
-    if elo < 1200:
-        return "gold"
-    if elo < 1500:
-        return "emerald"
-    if elo < 2000:
-        return "diamond"
-    if elo >= 2000:
-        return "netherite"
-    return "unranked"
-
-
-def get_raw_time(time):
-    raw_time = 0
-    time = list(reversed(time.split(":")))
-
-    for i, value in enumerate(time):
-        raw_time += int(value) * (60 ** i)
-
-    return raw_time * 1000
+def process(bastion):
+    # Single bastion in this process, for quick checks
+    shards = [shard for shard in find_shards() if shard[0] == bastion]
+    timelines.update()
+    totals, netherite_times = merge(map(process_shard, shards))
+    return summarise(totals[bastion], netherite_times[bastion])
 
 
-def main():
+def main(workers=None):
     bastion_pace_path = Path(__file__).parent / "data" / "bastion_pace.json"
     bastion_splits_path = Path(__file__).parent / "data" / "bastion_splits.json"
-    bastion_pace = {
-        "bridge": {},
-        "housing": {},
-        "stables": {},
-        "treasure": {},
-    }
-    bastion_splits = {
-        "bridge": [],
-        "housing": [],
-        "stables": [],
-        "treasure": [],
-    }
+    shards = find_shards()
+    timelines.update()
+    if workers == 1:
+        results = list(map(process_shard, shards))
+    else:
+        # Workers start from a fresh interpreter so none inherits the parent's sqlite connection
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            results = list(executor.map(process_shard, shards))
+    totals, netherite_times = merge(results)
+
+    bastion_pace = {}
+    bastion_splits = {}
     for bastion in BASTIONS:
-        bastion_pace[bastion], bastion_splits[bastion] = process(bastion)
+        bastion_pace[bastion], bastion_splits[bastion] = summarise(totals[bastion], netherite_times[bastion])
     bastion_pace_path.write_text(json.dumps(bastion_pace, indent=4))
     bastion_splits_path.write_text(json.dumps(bastion_splits, indent=4))
 
 
 if __name__ == "__main__":
-    main()
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else None)
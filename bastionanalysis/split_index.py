@@ -0,0 +1,83 @@
+import re
+from pathlib import Path
+
+import numpy as np
+
+DATA_DIR = Path(__file__).parent / "data"
+INDEX_DIR = DATA_DIR / "split_index"
+BASTIONS = ["bridge", "housing", "stables", "treasure"]
+RANKS = ["coal", "iron", "gold", "emerald", "diamond", "netherite"]
+# Rows from the combined {bastion}.txt dump rather than a rank shard
+COMBINED = -1
+TIME_PATTERN = r"^.*\s(\d:\d\d:\d\d)"
+DTYPE = np.dtype([("rank", np.int8), ("time", np.int32)])
+
+
+def get_raw_time(time):
+    raw_time = 0
+    time = list(reversed(time.split(":")))
+
+    for i, value in enumerate(time):
+        raw_time += int(value) * (60 ** i)
+
+    return raw_time * 1000
+
+
+def parse(path):
+    times = []
+    with open(path) as f:
+        for line in f:
+            match = re.match(TIME_PATTERN, line)
+            if match:
+                times.append(get_raw_time(match.group(1)))
+    return times
+
+
+def sources(bastion):
+    return {
+        COMBINED: DATA_DIR / f"{bastion}.txt",
+        **{rank: DATA_DIR / bastion / f"{rank}.txt" for rank in range(len(RANKS))},
+    }
+
+
+def build(bastion):
+    groups = {rank: parse(path) for rank, path in sources(bastion).items() if path.exists()}
+    index = np.empty(sum(len(times) for times in groups.values()), dtype=DTYPE)
+    index["rank"] = np.repeat(list(groups), [len(times) for times in groups.values()])
+    index["time"] = [time for times in groups.values() for time in times]
+    # Sorted by rank then time so each rank is a contiguous, ordered slice
+    index.sort(order=["rank", "time"])
+
+    INDEX_DIR.mkdir(exist_ok=True)
+    tmp = INDEX_DIR / f"{bastion}.tmp.npy"
+    np.save(tmp, index)
+    tmp.replace(INDEX_DIR / f"{bastion}.npy")
+    return index
+
+
+def load(bastion):
+    path = INDEX_DIR / f"{bastion}.npy"
+    source_paths = [path for path in sources(bastion).values() if path.exists()]
+    if not path.exists() or any(
+        source.stat().st_mtime > path.stat().st_mtime for source in source_paths
+    ):
+        build(bastion)
+    return np.load(path, mmap_mode="r")
+
+
+def load_times(bastion, rank=None):
+    # rank is a name from RANKS, or None for the combined dump
+    index = load(bastion)
+    code = COMBINED if rank is None else RANKS.index(rank)
+    start, end = np.searchsorted(index["rank"], [code, code + 1])
+    return np.asarray(index["time"][start:end])
+
+
+def main():
+    for bastion in BASTIONS:
+        index = build(bastion)
+        print(bastion, len(index))
+
+
+if __name__ == "__main__":
+    main()
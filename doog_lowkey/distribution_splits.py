@@ -1,13 +1,16 @@
 import json
 from math import isnan
-import math
 import random
 from manim import *
 import os
 from pathlib import Path
 import pandas as pd
 from datetime import datetime, timedelta
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
 from rankedutils import numb, word
+from videoutils import histogram
 
 ROOT = Path(__file__).parent
 player = None
@@ -43,18 +46,9 @@ class Plot(Scene):
             data = json.load(f)
 
         data_oi = data[player]["9"][split]
-        histogram = [0] * CLASSES
-        for point in data_oi:
-            secs = point / 1000
-            data_class = math.floor((secs - X_MIN) / X_STEP)
-            if 0 <= data_class < CLASSES:
-                histogram[data_class] += 1
-
-        percentile_data = [
-            np.percentile(data_oi, percentile)
-            for percentile
-            in PERCENTILES
-        ]
+        summary = histogram.summarise(data_oi, X_MIN * 1000, X_STEP * 1000, CLASSES, percentiles=PERCENTILES)
+        counts = summary["counts"].tolist()
+        percentile_data = summary["percentiles"]
 
         # Title
         title = Text(f"{player.capitalize()} - {split}", font_size=24)
@@ -63,8 +57,8 @@ class Plot(Scene):
         # Bar chart
         chart = BarChart(
             bar_names=[f"{numb.digital_time(1000 * (i * X_STEP + X_MIN))}" if i % 3 == 0 else "" for i in range(CLASSES)],
-            y_range=[0, max(histogram), 5],
-            values=histogram,
+            y_range=[0, max(counts), 5],
+            values=counts,
             axis_config={"font_size": 16},
             x_axis_config={
             },
@@ -82,7 +76,7 @@ class Plot(Scene):
         # Percentile lines
         hidden_axes = Axes(
             x_range=[X_MIN, X_MAX, X_STEP],
-            y_range=[0, max(histogram) // 5 * 5 + 5, 5],
+            y_range=[0, max(counts) // 5 * 5 + 5, 5],
             x_length=chart.x_axis.length,
             y_length=chart.y_axis.length,
             axis_config={
@@ -96,7 +90,7 @@ class Plot(Scene):
             secs = percentile / 1000
             x_pixel = hidden_axes.c2p(secs, 0)[0]
             y0 = hidden_axes.c2p(secs, 0)[1]
-            y1 = hidden_axes.c2p(secs, max(histogram))[1]
+            y1 = hidden_axes.c2p(secs, max(counts))[1]
             line = Line(
                 start=[x_pixel, y0, 0],
                 end=[x_pixel, y1, 0],
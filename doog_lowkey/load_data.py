@@ -1,48 +1,60 @@
 import asyncio
 import json
 from pathlib import Path
-from rankedutils import api, games
+import sys
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+from rankedutils import api
+from videoutils import matchcache
+from videoutils.scheduler import Scheduler
 
 PLAYERS = ["doogile", "Lowk3y_"]
+SEASONS = range(1, 10)
+SPLITS = {
+    "end": "story.enter_the_end",
+    "stronghold": "story.follow_ender_eye",
+    "fortress": "nether.find_fortress",
+}
 ROOT = Path(__file__).resolve().parent
 
+
+def get_season_data(uuid, detailed_matches):
+    season_data = {"comp": []}
+    season_data.update({split: [] for split in SPLITS})
+    for match in detailed_matches:
+        if match["forfeited"] == False and match["result"]["uuid"] == uuid:
+            season_data["comp"].append(match["result"]["time"])
+        # First occurrence of each event type, in a single scan of the timeline
+        first_times = {}
+        for event in match["timelines"]:
+            first_times.setdefault(event["type"], event["time"])
+        for split, event_type in SPLITS.items():
+            if event_type in first_times:
+                season_data[split].append(first_times[event_type])
+    return season_data
+
+
+async def load_season(scheduler, player, season):
+    print(player, season)
+    player_response = await scheduler.get(api.User(player, season=season))
+    detailed_matches = await matchcache.user_matches(player_response["uuid"], season, scheduler, 10000)
+    return get_season_data(player_response["uuid"], detailed_matches)
+
+
 async def get_player_data():
+    scheduler = Scheduler()
+    pairs = [(player, season) for player in PLAYERS for season in SEASONS]
+    season_data = await asyncio.gather(
+        *[load_season(scheduler, player, season) for player, season in pairs]
+    )
     player_data = {player: {} for player in PLAYERS}
-    for player in PLAYERS:
-        for season in range(1, 10):
-            print(player, season)
-            player_data[player][season] = {}
-            player_response = api.User(player, season=season).get()
-            _, detailed_matches = await games.get_detailed_matches(player_response, season, 0, 10000)
-            player_data[player][season]["full"] = detailed_matches
-            player_data[player][season]["comp"] = [
-                match["result"]["time"]
-                for match
-                in detailed_matches
-                if match["forfeited"] == False
-                and match["result"]["uuid"] == player_response["uuid"]
-            ]
-            player_data[player][season]["end"] = [
-                next(event["time"] for event in match["timelines"] if event["type"] == "story.enter_the_end")
-                for match
-                in detailed_matches
-                if "story.enter_the_end" in (event["type"] for event in match["timelines"])
-            ]
-            player_data[player][season]["stronghold"] = [
-                next(event["time"] for event in match["timelines"] if event["type"] == "story.follow_ender_eye")
-                for match
-                in detailed_matches
-                if "story.follow_ender_eye" in (event["type"] for event in match["timelines"])
-            ]
-            player_data[player][season]["fortress"] = [
-                next(event["time"] for event in match["timelines"] if event["type"] == "nether.find_fortress")
-                for match
-                in detailed_matches
-                if "nether.find_fortress" in (event["type"] for event in match["timelines"])
-            ]
+    for (player, season), data in zip(pairs, season_data):
+        player_data[player][season] = data
 
+    scheduler.report()
     with open(ROOT / "data.json", "w") as f:
-        json.dump(player_data, f, indent=4)
+        json.dump(player_data, f)
 
 
 if __name__ == "__main__":
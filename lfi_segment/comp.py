@@ -1,14 +1,16 @@
 import json
 from math import isnan
-import numpy as np
-import math
 import random
 from manim import *
 import os
 from pathlib import Path
 import pandas as pd
 from datetime import datetime, timedelta
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
 from rankedutils import numb, word
+from videoutils import histogram
 
 ROOT = Path(__file__).parent
 player = None
@@ -45,19 +47,18 @@ class Plot(Scene):
         with open(ROOT / "data" / "comp_history.json", "r") as f:
             data = json.load(f)
 
-        data_oi = data["v_strid"]
-        histogram = [0] * CLASSES
-        for point in data_oi:
-            secs = point / 1000
-            data_class = math.floor((secs - X_MIN) / X_STEP)
-            if 0 <= data_class < CLASSES:
-                histogram[data_class] += 1
-
-        percentile_data = [
-            np.percentile(data[PLAYER_OI], percentile)
-            for percentile
-            in PERCENTILES
-        ]
+        # Every player's histogram, smoothed curve and percentiles in one pass
+        sigma_bins = max(1.0, CLASSES * 0.03)
+        summaries = histogram.batch(
+            {p: data[p] for p in PLAYERS if p in data},
+            X_MIN * 1000,
+            X_STEP * 1000,
+            CLASSES,
+            percentiles=PERCENTILES,
+            sigma_bins=sigma_bins,
+        )
+        counts = histogram.counts(data["v_strid"], X_MIN * 1000, X_STEP * 1000, CLASSES)
+        percentile_data = summaries[PLAYER_OI]["percentiles"]
 
         # Title
         title = Text(f"{PLAYER_OI.lower()} completions", font_size=24)
@@ -69,7 +70,7 @@ class Plot(Scene):
         subtitle.next_to(title, DOWN)
 
         # Axes
-        max_count = max(histogram)
+        max_count = max(counts)
         axes = Axes(
             x_range=[X_MIN, X_MAX, X_STEP],
             y_range=[0, max_count * 1.1, max(1, int(max_count / 5))],
@@ -96,35 +97,14 @@ class Plot(Scene):
         axes.y_axis.set_opacity(0)
 
         # Prepare smoothed distributions for every player
-        player_smoothed = {}
+        player_smoothed = {p: summaries[p]["smoothed"] for p in summaries}
         bin_centers = [((i * X_STEP + X_MIN) + X_STEP / 2) for i in range(CLASSES)]
 
-        sigma_bins = max(1.0, CLASSES * 0.03)
-        kernel_size = int(max(3, sigma_bins * 8)) | 1
-        xs = np.linspace(-4 * sigma_bins, 4 * sigma_bins, kernel_size)
-        kernel = np.exp(-0.5 * (xs / sigma_bins) ** 2)
-        kernel /= kernel.sum()
-
-        for p in PLAYERS:
-            if p not in data:
-                continue
-            data_oi_p = data[p]
-            hist_p = [0] * CLASSES
-            for point in data_oi_p:
-                secs = point / 1000
-                data_class = math.floor((secs - X_MIN) / X_STEP)
-                if 0 <= data_class < CLASSES:
-                    hist_p[data_class] += 1
-            counts = np.array(hist_p, dtype=float)
-            counts_smoothed = np.convolve(counts, kernel, mode="same")
-            counts_smoothed = np.clip(counts_smoothed, 0.0, None)
-            player_smoothed[p] = counts_smoothed
-
         # Determine max across all players to scale axes
         if player_smoothed:
             global_max = max(v.max() for v in player_smoothed.values())
         else:
-            global_max = max(histogram)
+            global_max = max(counts)
 
         # Recompute axes vertical scaling based on global_max
         axes.y_range = [0, global_max * 1.1, max(1, int(global_max / 5))]
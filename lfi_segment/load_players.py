@@ -1,12 +1,11 @@
 import asyncio
-from io import BytesIO
-import json
 import pandas as pd
-from PIL import Image
-import requests
 from pathlib import Path
+import sys
 
-from rankedutils import api, constants, games, insight
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from rankedutils import constants, games, insight
+from videoutils import players
 
 
 ROOT = Path(__file__).parent
@@ -25,8 +24,7 @@ PLAYERS = [
 ]
 
 
-def get_player_data(nick):
-    response_data = api.User(nick, season=SEASON).get()
+def get_player_data(response_data):
     season_data = response_data["statistics"]["season"]
     stats = {
         "uuid": response_data["uuid"],
@@ -42,12 +40,6 @@ def get_player_data(nick):
     return stats
 
 
-def save_head(nick, uuid):
-    image = requests.get(f"https://mc-heads.net/avatar/{uuid}").content
-    image = Image.open(BytesIO(image))
-    image.save(ASSETS_DIR / f"{nick}.png")
-
-
 def get_history(uuid):
     elo_history = []
     completion_history = []
@@ -79,23 +71,19 @@ def get_history(uuid):
 
 
 async def main():
+    users = await players.load_players(PLAYERS, SEASON, ASSETS_DIR)
     player_data = {}
     elo_histories = {}
     completion_histories = {}
     game_results = {}
-    for i, nick in enumerate(PLAYERS):
-        player_data[nick] = get_player_data(nick)
+    for nick in PLAYERS:
+        player_data[nick] = get_player_data(users[nick])
         elo_histories[nick], completion_histories[nick], game_results[nick] = get_history(player_data[nick]["uuid"])
-        save_head(nick, player_data[nick]["uuid"])
 
-    with open(DATA_DIR / "players.json", "w") as f:
-        json.dump(player_data, f, indent=4)
-    with open(DATA_DIR / "elo_history.json", "w") as f:
-        json.dump(elo_histories, f, indent=4)
-    with open(DATA_DIR / "comp_history.json", "w") as f:
-        json.dump(completion_histories, f, indent=4)
-    with open(DATA_DIR / "game_results.json", "w") as f:
-        json.dump(game_results, f, indent=4)
+    players.write_json(DATA_DIR / "players.json", player_data)
+    players.write_json(DATA_DIR / "elo_history.json", elo_histories)
+    players.write_json(DATA_DIR / "comp_history.json", completion_histories)
+    players.write_json(DATA_DIR / "game_results.json", game_results)
 
 if __name__ == '__main__':
     asyncio.run(main())
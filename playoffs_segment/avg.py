@@ -8,6 +8,10 @@ import os
 from pathlib import Path
 from PIL import Image
 import requests
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from videoutils import histogram
 
 
 ROOT = Path(__file__).parent
@@ -31,20 +35,9 @@ class Avg(Scene):
         player_count = len(players)
         values = [data[player]["avg"] / 60000 for player in players]
 
-        histogram = [0] * CLASSES
-        avgs = []
-        with open(DATA_DIR / "avg.txt") as f:
-            while True:
-                line = f.readline()
-                if not line:
-                    break
-                avg = int(line.strip()) / 60000
-                avgs.append(avg)
-                avg_class = math.floor((avg - X_MIN) / STEP)
-                if 0 <= avg_class < CLASSES:
-                    histogram[avg_class] += 1 / STEP
-        median = np.median(avgs)
-        median_class = math.floor((median - X_MIN) / STEP)
+        avgs = np.loadtxt(DATA_DIR / "avg.txt", dtype=np.int64, ndmin=1) / 60000
+        summary = histogram.summarise(avgs, X_MIN, STEP, CLASSES, weight=1 / STEP)
+        median_class = summary["median_class"]
 
         # Title
         title = Text("Season 6 Average Completion Distribution (5+ Completions)", font_size=24)
@@ -54,7 +47,7 @@ class Avg(Scene):
         chart = BarChart(
             bar_names=[f"{digital_time(i * STEP + X_MIN)}" if i % (2 / STEP) == 0 else "" for i in range(CLASSES)],
             y_range=[0, 200, 25],
-            values=histogram,
+            values=summary["counts"].tolist(),
             axis_config={"font_size": 20},
             x_axis_config={
                 "include_ticks": False,
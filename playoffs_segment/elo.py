@@ -7,6 +7,10 @@ import os
 from pathlib import Path
 from PIL import Image
 import requests
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from videoutils import histogram
 
 
 ROOT = Path(__file__).parent
@@ -30,20 +34,9 @@ class Elo(Scene):
         player_count = len(players)
         values = [data[player]["elo"] for player in players]
 
-        histogram = [0] * CLASSES
-        elos = []
-        with open(DATA_DIR / "elo.txt") as f:
-            while True:
-                line = f.readline()
-                if not line:
-                    break
-                elo = int(line.strip())
-                elos.append(elo)
-                elo_class = math.floor((elo - X_MIN) / STEP)
-                if 0 <= elo_class < CLASSES:
-                    histogram[elo_class] += 1 / STEP
-        median = np.median(elos)
-        median_class = math.floor((median - X_MIN) / STEP)
+        elos = np.loadtxt(DATA_DIR / "elo.txt", dtype=np.int64, ndmin=1)
+        summary = histogram.summarise(elos, X_MIN, STEP, CLASSES, weight=1 / STEP)
+        median_class = summary["median_class"]
 
         # Title
         title = Text("Season 6 Elo Distribution", font_size=24)
@@ -53,7 +46,7 @@ class Elo(Scene):
         chart = BarChart(
             bar_names=[str(i * STEP) if i % (200 / STEP) == 0 else "" for i in range(CLASSES)],
             y_range=[0, 8, 1],
-            values=histogram,
+            values=summary["counts"].tolist(),
             axis_config={"font_size": 20},
             x_axis_config={
                 "include_ticks": False,
@@ -1,17 +1,15 @@
+import asyncio
 import math
 import sys
 from dotenv import load_dotenv
-from io import BytesIO
-import json
 from os import getenv
 import pandas as pd
-from PIL import Image
 import requests
 from pathlib import Path
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
-from rankedutils import api
+from videoutils import elo_history, players, query, versus
 
 
 load_dotenv()
@@ -31,8 +29,7 @@ SEASON_LENGTH = (SEASON_END - SEASON_START) // DAY
 SEASON = 7
 
 
-def get_player_data(nick):
-    response_data = api.User(nick, season=7).get()
+def get_player_data(response_data):
     season_data = response_data["statistics"]["season"]
     stats = {
         "uuid": response_data["uuid"],
@@ -44,111 +41,33 @@ def get_player_data(nick):
     return stats
 
 
-def save_head(nick, uuid):
-    image = requests.get(f"https://mc-heads.net/avatar/{uuid}").content
-    image = Image.open(BytesIO(image))
-    image.save(ASSETS_DIR / f"{nick}.png")
-
-
-def save_versus(nicks):
+def save_versus(nicks, uuids, seasons=(6,)):
+    _, cursor = query.connect()
+    wins = versus.head_to_head(cursor, uuids, seasons)
     wr_df = pd.DataFrame(columns=nicks, index=nicks)
     wins_df = pd.DataFrame(columns=nicks, index=nicks)
-    for player_1 in nicks:
-        for player_2 in nicks:
-            wr, wins = process_versus(player_1, player_2)
-            wr_df.at[player_2, player_1] = wr
-            wins_df.at[player_2, player_1] = wins
+    for i, player_1 in enumerate(nicks):
+        for j, player_2 in enumerate(nicks):
+            if i == j:
+                wr_df.at[player_2, player_1] = None
+                wins_df.at[player_2, player_1] = None
+                continue
+            games = wins[i, j] + wins[j, i]
+            wr_df.at[player_2, player_1] = round(wins[i, j] / games, 3) if games else None
+            wins_df.at[player_2, player_1] = int(wins[i, j])
 
     wr_df.to_csv(DATA_DIR / "winrate.csv")
     wins_df.to_csv(DATA_DIR / "wins.csv")
 
 
-def process_versus(player_1, player_2):
-    if player_1 == player_2:
-        return None, None
-
-    response_data = requests.get(
-        f"{API_URL}/users/{player_1}/versus/{player_2}?season=6",
-        headers=HEADERS,
-    ).json()["data"]
-    for player in response_data["players"]:
-        if player_1 == player["nickname"]:
-            uuid_1 = player["uuid"]
-        else:
-            uuid_2 = player["uuid"]
-    wins = response_data["results"]["ranked"][uuid_1]
-    losses = response_data["results"]["ranked"][uuid_2]
-    if wins + losses == 0:
-        winrate = None
-    else:
-        winrate = round(wins / (wins + losses), 3)
-    return winrate, wins
-
-
-def save_history(nicks, full=False):
-    history_df = pd.DataFrame(columns=nicks)
-    for nick in nicks:
-        print(f"Checking {nick}'s history")
-        if full:
-            mega_history = []
-            for s in reversed(range(1, SEASON + 1)):
-                print(f"season {s}")
-                mega_history += get_history(nick, s, len(mega_history))
-            print(mega_history)
-        else:
-            mega_history = get_history(nick)
-        history_df[nick] = pd.Series(reversed(mega_history))
-
+def save_history(nicks, uuids, full=False):
+    seasons = list(range(1, SEASON + 1)) if full else [SEASON]
+    logs = asyncio.run(elo_history.load_logs(uuids, seasons))
+    matrix = elo_history.elo_matrix(logs, uuids, seasons, SEASON_END, min_days=SEASON_LENGTH)
+    history_df = pd.DataFrame(matrix.T, columns=nicks)
     history_df.to_csv(DATA_DIR / f"history_{full}.csv")
 
 
-def get_history(nick, season=7, start_day=0):
-    i = 0
-    last_day = -1
-    day = -1
-    history = []
-    response_data = None
-    uuid = api.User(nick, season=season).get()["uuid"]
-
-    last_id = 10000000
-    while True:
-        response_data = api.UserMatches(nick, before=last_id, season=season, type=2, excludedecay=False).get()
-        if response_data == []:
-            for _ in range(SEASON_LENGTH - len(history)):
-                history.append(None)
-            break
-        last_id = response_data[-1]["id"]
-
-        for match in response_data:
-            assert match["date"] <= SEASON_END
-            day = (SEASON_END - match["date"]) // DAY
-
-            if day != last_day:
-                if day - last_day >= 1:
-                    for _ in range(day - last_day - 1):
-                        history.append(None)
-                try:
-                    if match["changes"][0]["uuid"] == uuid:
-                        elo = match["changes"][0]["eloRate"] + match["changes"][0]["change"]
-                    else:
-                        elo = match["changes"][1]["eloRate"] + match["changes"][1]["change"]
-                    history.append(elo)
-                    assert len(history) == day - start_day
-                    last_day = day
-                except:
-                    last_day = day
-        i += 1
-        print(f"day {day}")
-
-    last_elo = None
-    for i in reversed(range(len(history))):
-        if history[i] is None:
-            history[i] = last_elo
-        last_elo = history[i]
-
-    return history
-
-
 def main():
     response_data = requests.get(
         f"{API_URL}/phase-leaderboard?season=7",
@@ -157,16 +76,13 @@ def main():
     top_nicks = [player["nickname"] for player in response_data["users"][:16]]
     extras = ["ELO_PLUMBER4444", "TUDORULE", "Erikfzf", "dandannyboy"]
     nicks = top_nicks #  + extras
-    player_data = {}
-    for nick in nicks:
-        player_data[nick] = get_player_data(nick)
-        save_head(nick, player_data[nick]["uuid"])
+    users = asyncio.run(players.load_players(nicks, SEASON, ASSETS_DIR))
+    player_data = {nick: get_player_data(users[nick]) for nick in nicks}
 
-    # save_versus(nicks)
-    save_history(nicks, False)
+    # save_versus(nicks, [player_data[nick]["uuid"] for nick in nicks])
+    save_history(nicks, [player_data[nick]["uuid"] for nick in nicks], False)
 
-    with open(DATA_DIR / "players.json", "w") as f:
-        json.dump(player_data, f, indent=4)
+    players.write_json(DATA_DIR / "players.json", player_data)
 
 if __name__ == '__main__':
     main()
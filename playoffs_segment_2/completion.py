@@ -41,23 +41,25 @@ other_interests = {
 }
 
 
-def compute_moving_average(data_points, window_size=30, step=5):
-    data_points.sort(key=lambda x: x[0])
-    start = int(data_points[0][0] + window_size / 2)
-    end = int(data_points[-1][0] - window_size / 2)
+def compute_moving_average(dates, times, window_size=30, step=5):
+    # Rolling median over date-sorted points, split into segments wherever a window is empty
+    start = int(dates[0] + window_size / 2)
+    end = int(dates[-1] - window_size / 2)
+    centres = np.arange(start, end, step)
+    lows = np.searchsorted(dates, centres - window_size / 2, side="left")
+    highs = np.searchsorted(dates, centres + window_size / 2, side="right")
     smoothed_dates = []
     smoothed_times = []
     smoothed_date = []
     smoothed_time = []
     nan_streak = False
 
-    for date in range(start, end, step):
+    for date, low, high in zip(centres.tolist(), lows, highs):
         lower_bound = date - window_size / 2
         upper_bound = date + window_size / 2
 
-        filtered_points = [point[1] for point in data_points if lower_bound <= point[0] <= upper_bound]
-        average_time = np.median(filtered_points)
-        if not isnan(average_time):
+        if high > low:
+            average_time = np.median(times[low:high])
             nan_streak = False
             smoothed_date.append(date)
             smoothed_time.append(average_time / 1000)
@@ -76,6 +78,44 @@ def compute_moving_average(data_points, window_size=30, step=5):
     return smoothed_dates, smoothed_times
 
 
+def compute_moving_averages(dates, times, groupings, window_size=30, step=5):
+    # Every series of every grouping from a single sort, points labelled None are left out
+    group_codes = []
+    group_labels = []
+    for point_labels in groupings.values():
+        labels = list(dict.fromkeys(label for label in point_labels if label is not None))
+        label_codes = {label: i for i, label in enumerate(labels)}
+        group_codes.append([-1 if label is None else label_codes[label] for label in point_labels])
+        group_labels.append(labels)
+
+    codes = np.concatenate(group_codes)
+    groups = np.repeat(np.arange(len(groupings)), len(dates))
+    all_dates = np.tile(dates, len(groupings))
+    all_times = np.tile(times, len(groupings))
+    kept = codes >= 0
+    codes, groups, all_dates, all_times = codes[kept], groups[kept], all_dates[kept], all_times[kept]
+    order = np.lexsort((all_dates, codes, groups))
+    codes, groups, all_dates, all_times = codes[order], groups[order], all_dates[order], all_times[order]
+
+    keys = groups * (max(map(len, group_labels), default=0) + 1) + codes
+    _, starts = np.unique(keys, return_index=True)
+    ends = np.append(starts[1:], len(keys))
+    series = {name: {} for name in groupings}
+    names = list(groupings)
+    for start, end in zip(starts, ends):
+        name = names[groups[start]]
+        label = group_labels[groups[start]][codes[start]]
+        series[name][label] = compute_moving_average(all_dates[start:end], all_times[start:end], window_size, step)
+
+    return series
+
+
+def get_rank_line(elo):
+    if isnan(elo):
+        return None
+    return next((max_elo for max_elo in RANK_COLOURS if int(elo) < max_elo), None)
+
+
 def format_time(raw_time):
     time = str(timedelta(seconds=raw_time))[2:7]
     if time[0] == "0":
@@ -249,15 +289,20 @@ class Plot(Scene):
             "VILLAGE": VGroup(),
         }
 
+        series = compute_moving_averages(
+            np.array([data[0] for data in data_points]),
+            np.array([data[1] for data in data_points]),
+            {
+                "all": [0] * len(data_points),
+                "rank": [get_rank_line(data[2]) for data in data_points],
+                "bastion": [data[3] if data[3] in bastion_lines else None for data in data_points],
+                "ow": [data[4] if data[4] in ow_lines else None for data in data_points],
+            },
+        )
+
         min_elo = 0
         for i, max_elo in enumerate(rank_lines):
-            smoothed_date, smoothed_time = compute_moving_average(
-                [
-                    (data[0], data[1])
-                    for data in data_points
-                    if not isnan(data[2]) and min_elo <= int(data[2]) < max_elo
-                ]
-            )
+            smoothed_date, smoothed_time = series["rank"][max_elo]
             colour = ManimColor.from_hex(RANK_COLOURS[max_elo])
             for j in range(len(smoothed_date)):
                 if max_elo == 3000:
@@ -293,9 +338,7 @@ class Plot(Scene):
             min_elo = max_elo
 
         for i, bastion in enumerate(bastion_lines):
-            smoothed_date, smoothed_time = compute_moving_average(
-                [(data[0], data[1]) for data in data_points if data[3] == bastion]
-            )
+            smoothed_date, smoothed_time = series["bastion"][bastion]
             colour = ManimColor.from_hex(ANY_COLOURS[i])
             for j in range(len(smoothed_date)):
                 bastion_lines[bastion].add(plane.plot_line_graph(
@@ -315,9 +358,7 @@ class Plot(Scene):
             bastion_lines[bastion].add(legend)
 
         for i, ow in enumerate(ow_lines):
-            smoothed_date, smoothed_time = compute_moving_average(
-                [(data[0], data[1]) for data in data_points if data[4] == ow]
-            )
+            smoothed_date, smoothed_time = series["ow"][ow]
             colour = ManimColor.from_hex(ANY_COLOURS[i])
             for j in range(len(smoothed_date)):
                 ow_lines[ow].add(plane.plot_line_graph(
@@ -336,9 +377,7 @@ class Plot(Scene):
             legend = Text(ow.capitalize(), font_size=10, color=colour).next_to(square, LEFT, buff=0.2)
             ow_lines[ow].add(legend)
 
-        smoothed_date, smoothed_time = compute_moving_average(
-            [(data[0], data[1]) for data in data_points]
-        )
+        smoothed_date, smoothed_time = series["all"][0]
         line = plane.plot_line_graph(
             x_values=smoothed_date[0],
             y_values=smoothed_time[0],
@@ -5,9 +5,13 @@ import json
 from pathlib import Path
 import sys
 
+import numpy as np
+
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 from rankedutils import db, api
+from videoutils import query, splits, timelines
+from videoutils.scheduler import Scheduler
 
 
 START_ID = 101000
@@ -44,19 +48,22 @@ TAGS = [
     f"playoffs_s{season}"
     for season in range(1, CURRENT_SEASON)
 ]
-eos = False
+# Playoff runs from this player are left out of the disparity pairs
+EXCLUDED_UUID = "fc357f37ebbb4687971fdf8016b41a6f"
+DATA_DIR = ROOT_DIR / "playoffs_segment_2" / "data"
+CHECKPOINT_FILE = DATA_DIR / "completions_checkpoint.json"
 
 
-async def get_interest(id, season):
+async def get_interest(scheduler, id, season):
     cut_matches = {}
+    season_ended = id > LAST_MATCHES[season]
     print(f"Fetching matches before {id} for season {season}")
-    matches = await api.RecentMatches(before=id, season=season, type=2, count=100).get_async()
+    matches = await scheduler.get(api.RecentMatches(before=id, season=season, type=2, count=100))
     for match in matches:
         if match["forfeited"] is True:
             continue
-        if match["id"] + 1000 > LAST_MATCHES[season] or id > LAST_MATCHES[season]:
-            global eos
-            eos = True
+        if match["id"] + INCREMENT > LAST_MATCHES[season]:
+            season_ended = True
         winner_uuid = match["result"]["uuid"]
         winner_elo = next((change["eloRate"] for change in match["changes"] if change["uuid"] == winner_uuid))
         cut_matches[match["id"]] = {
@@ -66,44 +73,76 @@ async def get_interest(id, season):
             "ow": match["seed"]["overworld"],
             "bastion": match["seed"]["nether"],
         }
-    return cut_matches
+    return cut_matches, season_ended
 
 
 async def find_completions():
-    current_id = START_ID
-    season = 1
-    all_matches = {}
-    reached_end = False
-    while not reached_end:
-        ids = range(current_id, current_id + BATCH * INCREMENT, INCREMENT)
-        try:
-            match_groups = await asyncio.gather(
-                *[get_interest(id, season) for id in ids]
-            )
-        except api.APINotFoundError:
-            break
+    # Without a checkpoint the csv is rebuilt from scratch, otherwise new matches are appended
+    checkpoint = json.loads(CHECKPOINT_FILE.read_text()) if CHECKPOINT_FILE.exists() else {}
+    scheduler = Scheduler()
+    total_time = 0
+    total_matches = 0
+    with open(DATA_DIR / "completions.csv", mode="a" if checkpoint else "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=["date", "time", "elo", "bastion", "ow"])
+        if not checkpoint:
+            writer.writeheader()
+
+        for season in range(1, CURRENT_SEASON + 1):
+            progress = checkpoint.get(str(season), {"last_match": None, "finished": False})
+            if progress["finished"]:
+                continue
+            if progress["last_match"]:
+                current_id = progress["last_match"] + INCREMENT
+            elif season == 1:
+                current_id = START_ID
+            else:
+                current_id = LAST_MATCHES[season - 1] + INCREMENT
+
+            season_ended = False
+            while not season_ended:
+                ids = range(current_id, current_id + BATCH * INCREMENT, INCREMENT)
+                try:
+                    match_groups = await asyncio.gather(
+                        *[get_interest(scheduler, id, season) for id in ids]
+                    )
+                except api.APINotFoundError:
+                    scheduler.report()
+                    return timedelta(milliseconds=total_time).days, total_matches
+
+                batch_matches = {}
+                for matches, ended in match_groups:
+                    batch_matches.update(matches)
+                    season_ended = season_ended or ended
+                new_ids = sorted(
+                    id for id in batch_matches
+                    if not progress["last_match"] or id > progress["last_match"]
+                )
+                writer.writerows(sorted((batch_matches[id] for id in new_ids), key=lambda x: x["date"]))
+                csv_file.flush()
+                total_time += sum(batch_matches[id]["time"] for id in new_ids)
+                total_matches += len(new_ids)
 
-        for matches in match_groups:
-            global eos
-            if eos:
-                season += 1
-                current_id -= BATCH * INCREMENT
-                eos = False
-                if season > CURRENT_SEASON:
-                    reached_end = True
-            all_matches.update(matches)
-        current_id += BATCH * INCREMENT
+                if new_ids:
+                    progress["last_match"] = new_ids[-1]
+                # The current season keeps being crawled on later runs
+                progress["finished"] = season_ended and season < CURRENT_SEASON
+                checkpoint[str(season)] = progress
+                save_checkpoint(checkpoint)
+                scheduler.report()
+                current_id += BATCH * INCREMENT
 
-    total_time = timedelta(milliseconds=sum(
-        match["time"] for match in all_matches.values()
-    )).days
+    return timedelta(milliseconds=total_time).days, total_matches
 
-    return total_time, sorted(list(all_matches.values()), key=lambda x: x["date"])
+
+def save_checkpoint(checkpoint):
+    tmp = CHECKPOINT_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(checkpoint, indent=4))
+    tmp.replace(CHECKPOINT_FILE)
 
 
 async def find_disparity():
-    all_matches = {}
-    conn, cursor = db.start()
+    conn, cursor = query.connect()
+    store = timelines.load()
     matches = db.query_db(
         cursor,
         table="matches",
@@ -115,107 +154,81 @@ async def find_disparity():
     po_matches = [
         match
         for tag in TAGS
-        for match in db.query_db(
-            cursor,
-            table="matches",
-            items="id, seedType, bastionType, tag",
-            tag=tag,
-        )
+        for match in query.iter_query(cursor, items="id, seedType, bastionType, tag", tag=tag)
     ]
+    matches = po_matches + matches
+    matches, elos, runs = paired_runs(cursor, store, matches)
+    durations, reached = paired_splits(store, runs)
+
+    playoffs = np.array([bool(tag) and "playoffs" in tag for _, _, _, tag in matches], dtype=bool)
+    rated = np.all(elos > 0, axis=1)
     averages = {
-        "ranked": {
-            "ow": [],
-            "nether": [],
-            "bastion": [],
-            "fortress": [],
-            "blind": [],
-            "stronghold": [],
-            "fort-blind": [],
-        },
-        "po": {
-            "ow": [],
-            "nether": [],
-            "bastion": [],
-            "fortress": [],
-            "blind": [],
-            "stronghold": [],
-            "fort-blind": [],
-        }
+        "ranked": split_averages(durations, reached),
+        "po": split_averages(durations[playoffs], reached[playoffs]),
     }
-    for id, ow_type, bastion_type, tag in po_matches + matches:
-        disparity = {}
-        print(id)
-        run_1, run_2 = (run for run in db.query_db(
-            cursor,
-            table="runs",
-            items="eloRate, timeline, player_uuid",
-            match_id=id
-        ) if not tag or (run[1] != "[]" and run[2] != "fc357f37ebbb4687971fdf8016b41a6f"))
-        if tag and "playoffs" in tag:
-            match_elo = 3000
-        elif run_1[0] and run_2[0]:
-            match_elo = int((run_1[0] + run_2[0]) / 2)
-        else:
-            match_elo = None
-        timeline_1 = reversed(json.loads(run_1[1]))
-        timeline_2 = reversed(json.loads(run_2[1]))
-        previous_1 = 0
-        previous_2 = 0
-        fort_1 = 0
-        fort_2 = 0
-        for split in SPLIT_MAP:
-            time_1 = next((event["time"] for event in timeline_1 if event["type"] == split), None)
-            time_2 = next((event["time"] for event in timeline_2 if event["type"] == split), None)
-            if not (time_1 and time_2):
-                difference = None
-                break
-            if split == "nether.find_fortress":
-                fort_1 = time_1
-                fort_2 = time_2
-            if split == "story.follow_ender_eye" and fort_1 and fort_2:
-                fort_blind_1 = time_1 - fort_1
-                fort_blind_2 = time_2 - fort_2
-                fb_difference = abs(fort_blind_1 - fort_blind_2)
-                disparity["fort-blind"] = fb_difference
-                averages["ranked"]["fort-blind"].append(fort_blind_1)
-                averages["ranked"]["fort-blind"].append(fort_blind_2)
-                if match_elo == 3000:
-                    averages["po"]["fort-blind"].append(fort_blind_1)
-                    averages["po"]["fort-blind"].append(fort_blind_2)
-
-            split_1 = time_1 - previous_1
-            split_2 = time_2 - previous_2
-            averages["ranked"][SPLIT_MAP[split]].append(split_1)
-            averages["ranked"][SPLIT_MAP[split]].append(split_2)
-            if match_elo == 3000:
-                averages["po"][SPLIT_MAP[split]].append(split_1)
-                averages["po"][SPLIT_MAP[split]].append(split_2)
-            difference = abs(split_1 - split_2)
-            disparity[SPLIT_MAP[split]] = difference
-            previous_1 = time_1
-            previous_2 = time_2
 
+    disparities = np.abs(durations[:, 0] - durations[:, 1])
+    match_elos = elos.sum(axis=1) // 2
+    all_matches = {}
+    for i, (id, ow_type, bastion_type, _) in enumerate(matches):
         all_matches[id] = {
-            "elo": match_elo,
+            "elo": 3000 if playoffs[i] else int(match_elos[i]) if rated[i] else None,
             "o_type": ow_type,
             "b_type": bastion_type,
-            **disparity
-        }
-
-    averages = {
-        "ranked": {
-            split: sum(averages["ranked"][split]) / len(averages["ranked"][split])
-            for split in SPLITS
-        },
-        "po": {
-            split: sum(averages["po"][split]) / len(averages["po"][split])
-            for split in SPLITS
+            **{split: int(disparities[i, j]) for j, split in enumerate(SPLITS) if reached[i, j]}
         }
-    }
 
     return averages, list(all_matches.values())
 
 
+def paired_runs(cursor, store, matches):
+    # Elos and store runs of both players as (matches x 2), playoff matches dropping empty and excluded runs.
+    # Matches with a run newer than the timeline store are left out, so the matches kept are returned too
+    rows = [
+        (i, elo or 0, uuid, bool(match[3]))
+        for i, (match, runs) in enumerate(query.iter_match_runs(cursor, matches, items="eloRate, player_uuid"))
+        for elo, uuid in runs
+    ]
+    match_index = np.array([row[0] for row in rows], dtype=np.int64)
+    runs = store.find_runs([matches[i][0] for i in match_index.tolist()], [row[2] for row in rows])
+    found = runs >= 0
+    stored = np.where(found, runs, 0)
+    lengths = np.where(found, store.offsets[stored + 1] - store.offsets[stored], 0)
+    tagged = np.array([row[3] for row in rows], dtype=bool)
+    excluded = np.array([row[2] == EXCLUDED_UUID for row in rows], dtype=bool)
+    keep = ~tagged | ((lengths > 0) & ~excluded)
+    complete = np.bincount(match_index[~found], minlength=len(matches)) == 0
+    if not np.all(np.bincount(match_index[keep], minlength=len(matches))[complete] == 2):
+        raise ValueError("Every match needs exactly two runs")
+    keep &= complete[match_index]
+    elos = np.array([row[1] for row in rows], dtype=np.int64)
+    kept_matches = [match for match, kept in zip(matches, complete.tolist()) if kept]
+    return kept_matches, elos[keep].reshape(-1, 2), runs[keep].reshape(-1, 2)
+
+
+def paired_splits(store, runs):
+    # (matches x 2 x SPLITS) split durations with fort-blind last, and which splits both runs reached.
+    # A match stops counting at the first split either run is missing.
+    positions, types, times = store.events(runs.ravel())
+    # Each split is searched for after the previous one, so runs are walked in lockstep
+    split_matrix = splits.split_matrix(positions, types, times, runs.size, store.codes(SPLIT_MAP), ordered=True)
+    split_times = np.nan_to_num(split_matrix).astype(np.int64).reshape(len(runs), 2, len(SPLIT_MAP))
+    reached = np.cumprod(np.all(split_times != 0, axis=1), axis=1).astype(bool)
+    fortress = list(SPLIT_MAP).index("nether.find_fortress")
+    blind = list(SPLIT_MAP).index("story.follow_ender_eye")
+    fort_blind = split_times[:, :, blind] - split_times[:, :, fortress]
+    durations = np.concatenate([np.diff(split_times, axis=2, prepend=0), fort_blind[:, :, None]], axis=2)
+    return durations, np.column_stack([reached, reached[:, blind]])
+
+
+def split_averages(durations, reached):
+    # Mean of both runs' durations over the matches that reached each split
+    return {
+        split: int(durations[:, :, j][reached[:, j]].sum()) / (2 * int(np.count_nonzero(reached[:, j])))
+        for j, split in enumerate(SPLITS)
+    }
+
+
 def load_tags():
     conn, cursor = db.start()
     for tag in TAGS:
@@ -228,21 +241,21 @@ def load_tags():
 
 
 def main(data_type):
-    with open(ROOT_DIR / "playoffs_segment_2" / "data" / f"{data_type}.csv", mode="w", newline="") as csv_file:
-        if data_type == "completions":
-            total_time, all_matches = asyncio.run(find_completions())
-            print(f"Total time: {total_time} days")
-            writer = csv.DictWriter(csv_file, fieldnames=["date", "time", "elo", "bastion", "ow"])
-        else:
-            averages, all_matches = asyncio.run(find_disparity())
-            print(f"Averages: {averages}")
-            with open(ROOT_DIR / "playoffs_segment_2" / "data" / f"disparity.json", "w") as f:
-                json.dump(
-                    averages,
-                    f,
-                    indent=4
-                )
-            writer = csv.DictWriter(csv_file, fieldnames=["elo", "b_type", "o_type", "ow", "nether", "bastion", "fortress", "blind", "stronghold", "fort-blind"])
+    if data_type == "completions":
+        total_time, match_count = asyncio.run(find_completions())
+        print(f"Added {match_count} completions, total time: {total_time} days")
+        return
+
+    with open(DATA_DIR / f"{data_type}.csv", mode="w", newline="") as csv_file:
+        averages, all_matches = asyncio.run(find_disparity())
+        print(f"Averages: {averages}")
+        with open(DATA_DIR / f"disparity.json", "w") as f:
+            json.dump(
+                averages,
+                f,
+                indent=4
+            )
+        writer = csv.DictWriter(csv_file, fieldnames=["elo", "b_type", "o_type", "ow", "nether", "bastion", "fortress", "blind", "stronghold", "fort-blind"])
         writer.writeheader()
         writer.writerows(all_matches)
 
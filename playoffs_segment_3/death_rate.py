@@ -5,7 +5,12 @@ from manim import *
 from pathlib import Path
 from numpy import isnan
 import pandas as pd
-from rankedutils import api, games
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from rankedutils import api
+from videoutils import deaths, matchcache
+from videoutils.scheduler import Scheduler
 
 
 ROOT = Path(__file__).parent
@@ -56,51 +61,37 @@ PLAYOFF_MATCHES = [
 ]
 
 
+async def load_player_matches(scheduler, player):
+    player_response = await scheduler.get(api.User(player))
+    matches = await matchcache.user_matches(player_response["uuid"], 8, scheduler, 10000)
+    return player_response["uuid"], matches
+
+
 async def analyse_deaths():
-    all_death_data = {}
-    for player in ALL_NICKS:
-        print(player)
-        game_count = 0
-        death_count = 0
-        player_response = api.User(player).get()
-        _, matches = await games.get_detailed_matches(player_response, 8, 0, 10000)
-        for match in matches:
-            game_count += 1
-            timeline = match["timelines"]
-            if (
-                "projectelo.timeline.death" in (event["type"] for event in timeline if event["uuid"] == player_response["uuid"])
-                or "projectelo.timeline.reset" in (event["type"] for event in timeline if event["uuid"] == player_response["uuid"])
-            ):
-                death_count += 1
-        death_data = {
-            "games": game_count,
-            "deaths": death_count,
-            "death_rate": round(death_count / game_count * 100, 1),
-        }
-        all_death_data[player] = death_data
-
-    return all_death_data
-
-
-def analyse_playoff_deaths():
-    run_count = 0
-    death_count = 0
-    for id in PLAYOFF_MATCHES:
-        match = api.Match(id).get()
-        run_count += 2
-        timeline = match["timelines"]
-        for event in timeline:
-            uuid_seen = ""
-            if event["type"] in ["projectelo.timeline.death", "projectelo.timeline.reset"] and event["uuid"] != uuid_seen:
-                death_count += 1
-                uuid_seen = event["uuid"]
-        print(death_count, run_count)
-    death_data = {
-        "runs": run_count,
-        "deaths": death_count,
-        "death_rate": round(death_count / run_count * 100, 1),
+    scheduler = Scheduler()
+    player_matches = await asyncio.gather(
+        *[load_player_matches(scheduler, player) for player in ALL_NICKS]
+    )
+    scheduler.report()
+    return {
+        player: deaths.player_stats(uuid, matches)
+        for player, (uuid, matches) in zip(ALL_NICKS, player_matches)
     }
-    return death_data
+
+
+async def analyse_playoff_deaths():
+    matches = await matchcache.gather(PLAYOFF_MATCHES, Scheduler())
+    return deaths.match_stats(matches)
+
+
+async def analyse():
+    data = await analyse_deaths()
+    with open(DATA_DIR / "death.json", "w") as f:
+        json.dump(data, f, indent=4)
+    playoff_data = await analyse_playoff_deaths()
+    print(playoff_data)
+    with open(DATA_DIR / "playoff_death.json", "w") as f:
+        json.dump(playoff_data, f, indent=4)
 
 
 class Plot(Scene):
@@ -117,16 +108,13 @@ class Plot(Scene):
         subtitle = Text("Using Season 8 Data", font_size=18)
         subtitle.next_to(title, DOWN, buff=0.2)
 
-        # data = asyncio.run(analyse_deaths())
-        # with open(DATA_DIR / "death.json", "w") as f:
-        #     json.dump(data, f, indent=4)
+        # Run with "analyse" to refresh death.json
         with open(DATA_DIR / "death.json") as f:
             data = json.load(f)
 
         data = dict(sorted(data.items(), key=lambda x: x[1]["death_rate"]))
         avg = round(sum(data[player]["death_rate"] for player in data) / 16, 1)
         print(avg)
-        print(analyse_playoff_deaths())
 
         profiles = Group()
         for i, name in enumerate(data):
@@ -147,5 +135,8 @@ class Plot(Scene):
 
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ["analyse"]:
+        asyncio.run(analyse())
+        sys.exit()
     name = os.path.basename(__file__)[:-3]
     os.system(rf"manim -qp -o {name} {name}.py {name.capitalize()}")
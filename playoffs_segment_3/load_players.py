@@ -1,12 +1,11 @@
 import asyncio
-from io import BytesIO
-import json
 import pandas as pd
-from PIL import Image
-import requests
 from pathlib import Path
+import sys
 
-from rankedutils import api, constants
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from rankedutils import constants
+from videoutils import players, query, versus
 
 
 ROOT = Path(__file__).parent
@@ -15,8 +14,7 @@ DATA_DIR = ROOT / "data"
 SEASON = 8
 
 
-def get_player_data(nick, seed):
-    response_data = api.User(nick, season=SEASON).get()
+def get_player_data(response_data, seed):
     season_data = response_data["statistics"]["season"]
     stats = {
         "uuid": response_data["uuid"],
@@ -33,68 +31,37 @@ def get_player_data(nick, seed):
     return stats
 
 
-def save_head(nick, uuid):
-    image = requests.get(f"https://mc-heads.net/avatar/{uuid}").content
-    image = Image.open(BytesIO(image))
-    image.save(ASSETS_DIR / f"{nick}.png")
-
-
-async def save_versus(nicks):
+def save_versus(nicks, uuids, seasons=range(7, 10)):
+    _, cursor = query.connect()
+    wins = versus.head_to_head(cursor, uuids, list(seasons))
     wr_df = pd.DataFrame(columns=nicks, index=nicks)
     wins_df = pd.DataFrame(columns=nicks, index=nicks)
     for i, player_1 in enumerate(nicks):
-        print(player_1)
-        for player_2 in nicks[i+1:]:
-            wr, wins, losses = await process_versus(player_1, player_2)
+        for j, player_2 in enumerate(nicks[i+1:], i + 1):
+            total = wins[i, j] + wins[j, i]
+            wr = int(((wins[i, j] - wins[j, i]) / total) * 100) if total else None
             wr_df.at[player_1, player_2] = wr
-            wins_df.at[player_1, player_2] = wins
+            wins_df.at[player_1, player_2] = int(wins[i, j])
             wr_df.at[player_2, player_1] = -wr if wr is not None else None
-            wins_df.at[player_2, player_1] = losses
+            wins_df.at[player_2, player_1] = int(wins[j, i])
 
     wr_df.to_csv(DATA_DIR / "winrate.csv")
     wins_df.to_csv(DATA_DIR / "wins.csv")
 
 
-async def process_versus(player_1, player_2):
-    if player_1 == player_2:
-        return None, None
-
-    wins = 0
-    losses = 0
-    for season in range(7, 10):
-        response_data = await api.Versus(player_1, player_2, season=season).get_async()
-        uuid_1 = next(player["uuid"] for player in response_data["players"] if player_1 == player["nickname"])
-        uuid_2 = next(player["uuid"] for player in response_data["players"] if player_2 == player["nickname"])
-        wins += response_data["results"]["ranked"][uuid_1]
-        losses += response_data["results"]["ranked"][uuid_2]
-    if wins + losses == 0:
-        winrate = None
-    else:
-        print((wins - losses), (wins + losses), (wins - losses) / (wins + losses))
-        winrate = int(((wins - losses) / (wins + losses)) * 100)
-    return winrate, wins, losses
-
-
 async def main():
     nicks = ["lowk3y_", "doogile", "Infume", "bing_pigs", "hackingnoises", "DARVY__X1", "Aquacorde", "v_strid"]
     all_nicks = ["lowk3y_", "doogile", "Infume", "bing_pigs", "hackingnoises", "DARVY__X1", "Aquacorde", "v_strid", "edcr", "Ranik_", "7rowl", "silverrruns", "Feinberg", "BeefSalad", "KenanKardes", "TUDORULE"]
     seeds = [7, 3, 2, 6, 16, 12, 9, 14, 1, 8, 4, 5, 11, 10, 13, 15]
-    player_data = {}
-    for i, nick in enumerate(nicks):
-        player_data[nick] = get_player_data(nick, seeds[i])
-        save_head(nick, player_data[nick]["uuid"])
-    all_player_data = {}
-    for i, nick in enumerate(all_nicks):
-        all_player_data[nick] = get_player_data(nick, seeds[i])
-        save_head(nick, all_player_data[nick]["uuid"])
-
-    await save_versus(nicks)
+    # nicks is a subset of all_nicks, so every profile and avatar is only fetched once
+    users = await players.load_players(all_nicks + nicks, SEASON, ASSETS_DIR)
+    player_data = {nick: get_player_data(users[nick], seeds[i]) for i, nick in enumerate(nicks)}
+    all_player_data = {nick: get_player_data(users[nick], seeds[i]) for i, nick in enumerate(all_nicks)}
 
-    with open(DATA_DIR / "players.json", "w") as f:
-        json.dump(player_data, f, indent=4)
+    save_versus(nicks, [users[nick]["uuid"] for nick in nicks])
 
-    with open(DATA_DIR / "all_players.json", "w") as f:
-        json.dump(all_player_data, f, indent=4)
+    players.write_json(DATA_DIR / "players.json", player_data)
+    players.write_json(DATA_DIR / "all_players.json", all_player_data)
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -1,5 +1,9 @@
-import requests
+import asyncio
 from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from videoutils import avatars
 
 
 players = [
@@ -59,7 +63,4 @@ players = [
 ASSETS_DIR = Path(__file__).parent / "assets"
 
 
-for player in players:
-    resp = requests.get(f"https://mc-heads.net/avatar/{player}/128")
-    with open(ASSETS_DIR / f"{player}.png", "wb") as f:
-        f.write(resp.content)
+asyncio.run(avatars.save_avatars({player: player for player in players}, ASSETS_DIR, size=128))
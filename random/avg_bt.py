@@ -1,5 +1,4 @@
 from datetime import timedelta
-import json
 from pathlib import Path
 import sys
 from manim import *
@@ -10,6 +9,7 @@ ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 
 from rankedutils import db
+from videoutils import query, timelines
 
 
 def compute_moving_average(data_points, window_size=100, step=10):
@@ -30,7 +30,9 @@ def compute_moving_average(data_points, window_size=100, step=10):
 
 
 def find_bts():
-    conn, cursor = db.start()
+    conn, cursor = query.connect()
+    store = timelines.load()
+    iron_code = store.code("story.smelt_iron")
     matches = db.query_db(
         cursor,
         items="id",
@@ -41,23 +43,21 @@ def find_bts():
     iron_time = 0
     irons = 0
     data_points = []
-    for match in matches:
-        runs = db.query_db(
-            cursor,
-            table="runs",
-            items="eloRate, timeline, player_uuid",
-            match_id=match[0]
-        )
+    for match, runs in query.iter_match_runs(cursor, matches, items="eloRate, player_uuid"):
         for run in runs:
-            elo, timeline, uuid = run
+            elo, uuid = run
             if not elo:
                 continue
-            for event in reversed(json.loads(timeline)):
-                if event["type"] == "story.smelt_iron":
-                    print(event)
-                    iron_time += event["time"]
-                    irons += 1
-                    data_points.append((elo, event["time"]))
+            timeline = store.timeline(match[0], uuid)
+            # Runs newer than the timeline store are left out
+            if timeline is None:
+                continue
+            event_types, event_times = timeline
+            for time in event_times[event_types == iron_code].tolist():
+                print(time)
+                iron_time += time
+                irons += 1
+                data_points.append((elo, time))
     avg_iron = iron_time / irons
     return avg_iron, data_points
 
@@ -5,7 +5,9 @@ import sys
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 
+import numpy as np
 from rankedutils import db
+from videoutils import query, ranks, splits, timelines
 
 SPLIT_MAP = {
     "story.enter_the_nether": "ow",
@@ -16,75 +18,71 @@ SPLIT_MAP = {
     "story.enter_the_end": "stronghold",
 }
 SPLITS = ["ow", "nether", "bastion", "fortress", "blind", "stronghold", "end"]
+SEASON = 7
+# Output keys, the upper elo bound of each rank
 RANKS = [600, 900, 1200, 1500, 2000, 3000]
 
 
 def analyse_ratios():
-    conn, cursor = db.start()
+    conn, cursor = query.connect()
+    store = timelines.load()
     matches = db.query_db(
         cursor,
         items="id, result_uuid, time",
         type=2,
         forfeited=False,
         decayed=False,
-        season=7,
+        season=SEASON,
     )
     print(f"Analysing {len(matches)} matches")
-    completion_time = 0
-    completions = 0
-    ranked_completion_time = {rank: 0 for rank in RANKS}
-    ranked_completions = {rank: 0 for rank in RANKS}
-    split_times = {split: 0 for split in SPLITS}
-    splits = {split: 0 for split in SPLITS}
-    ranked_split_times = {rank: {split: 0 for split in SPLITS} for rank in RANKS}
-    ranked_splits = {rank: {split: 0 for split in SPLITS} for rank in RANKS}
-    for match in matches:
-        runs = db.query_db(
-            cursor,
-            table="runs",
-            items="eloRate, timeline, player_uuid",
-            match_id=match[0]
-        )
-        for run in runs:
-            elo, timeline, uuid = run
-            if match[1] != uuid:
-                continue
-            completion_time += match[2]
-            completions += 1
-            timeline = list(reversed(json.loads(timeline)))
-            previous = 0
-            for split_name in SPLIT_MAP:
-                time = next((event["time"] for event in timeline if event["type"] == split_name), None)
-                if time is None:
-                    print(f"Missing split {split_name} for match {match[0]}")
-                    break
-                split_time = time - previous
-                previous = time
-                if split_time < 0:
-                    break
-
-                split_short = SPLIT_MAP[split_name]
-                split_times[split_short] += split_time
-                splits[split_short] += 1
-                if elo:
-                    for max_elo in RANKS:
-                        if elo < max_elo:
-                            ranked_split_times[max_elo][split_short] += split_time
-                            ranked_splits[max_elo][split_short] += 1
-                            break
-            end_time = match[2] - previous
-            split_times["end"] += end_time
-            splits["end"] += 1
-            if elo:
-                for max_elo in RANKS:
-                    if elo < max_elo:
-                        ranked_completion_time[max_elo] += match[2]
-                        ranked_completions[max_elo] += 1
-                        ranked_split_times[max_elo]["end"] += end_time
-                        ranked_splits[max_elo]["end"] += 1
-                        break
-
-    average_split_times = {split: round(split_times[split] / splits[split]) for split in SPLITS}
+    winners = [
+        (match, elo, uuid)
+        for match, runs in query.iter_match_runs(cursor, matches, items="eloRate, player_uuid")
+        for elo, uuid in runs
+        if match[1] == uuid
+    ]
+    runs = store.find_runs([match[0] for match, _, _ in winners], [uuid for _, _, uuid in winners])
+    # Runs newer than the timeline store are left out
+    found = runs >= 0
+    winners = [winner for winner, run_found in zip(winners, found.tolist()) if run_found]
+    runs = runs[found]
+    match_times = np.array([match[2] for match, _, _ in winners], dtype=np.int64)
+    elos = np.array([elo or 0 for _, elo, _ in winners])
+    positions, types, times = store.events(runs)
+    split_matrix = splits.split_matrix(positions, types, times, len(runs), store.codes(SPLIT_MAP))
+    split_lengths = splits.durations(split_matrix)
+
+    # Splits count until the first missing or negative one, which still sets the start of the end split
+    present = ~np.isnan(split_matrix)
+    counted = np.cumprod(present & (split_lengths >= 0), axis=1).astype(bool)
+    reached = np.hstack([np.ones((len(runs), 1), dtype=bool), counted[:, :-1]])
+    walked = present & reached
+    print(f"Missing splits in {np.count_nonzero((~present & reached).any(axis=1))} runs")
+    last_walked = walked.sum(axis=1) - 1
+    previous = np.where(last_walked >= 0, split_matrix[np.arange(len(runs)), last_walked.clip(0)], 0)
+    end_times = match_times - previous.astype(np.int64)
+    split_lengths = np.column_stack([np.where(counted, split_lengths, 0).astype(np.int64), end_times])
+    counted = np.column_stack([counted, np.ones(len(runs), dtype=bool)])
+
+    rank_index = ranks.classify(elos, SEASON)
+    ranked = (rank_index != ranks.UNRANKED) & (elos < RANKS[-1])
+
+    completion_time = int(match_times.sum())
+    completions = len(runs)
+    split_times = {split: int(split_lengths[:, i].sum()) for i, split in enumerate(SPLITS)}
+    split_counts = {split: int(counted[:, i].sum()) for i, split in enumerate(SPLITS)}
+    ranked_completion_time = {}
+    ranked_completions = {}
+    ranked_split_times = {}
+    ranked_splits = {}
+    for i, rank in enumerate(RANKS):
+        in_rank = ranked & (rank_index == i)
+        ranked_completion_time[rank] = int(match_times[in_rank].sum())
+        ranked_completions[rank] = int(in_rank.sum())
+        ranked_split_times[rank] = {split: int(split_lengths[in_rank, j].sum()) for j, split in enumerate(SPLITS)}
+        ranked_splits[rank] = {split: int(counted[in_rank, j].sum()) for j, split in enumerate(SPLITS)}
+
+    average_split_times = {split: round(split_times[split] / split_counts[split]) for split in SPLITS}
     ranked_average_split_times = {rank: {split: round(ranked_split_times[rank][split] / ranked_splits[rank][split]) for split in SPLITS} for rank in RANKS}
 
     print(f"Total completion time: {completion_time}")
@@ -94,7 +92,7 @@ def analyse_ratios():
     print(f"Ranked total completions: {ranked_completions}")
     print("Ranked average completion time:", {rank: (ranked_completion_time[rank] / ranked_completions[rank]) for rank in RANKS})
     print(f"Total split times: {split_times}")
-    print(f"Total splits: {splits}")
+    print(f"Total splits: {split_counts}")
     print("Average split times:", average_split_times)
     print(f"Ranked total split times: {ranked_split_times}")
     print(f"Ranked total splits: {ranked_splits}")
@@ -105,7 +103,7 @@ def analyse_ratios():
     print("Split proportions:", split_ratio)
     print("Ranked split proportions:", ranked_split_ratio)
 
-    return split_ratio, splits, average_split_times, ranked_split_ratio, ranked_splits, ranked_average_split_times
+    return split_ratio, split_counts, average_split_times, ranked_split_ratio, ranked_splits, ranked_average_split_times
 
 
 def main():
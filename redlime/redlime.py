@@ -7,60 +7,20 @@ ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 import numpy as np
 from rankedutils import api, constants, insight
+from videoutils import ranks
+from videoutils.scheduler import Scheduler
 
 
 INCREMENT = 500
 BATCH = 50
-RANKS = {
-    "coal": {
-        1: 0,
-        2: 400,
-        3: 500,
-    },
-    "iron": {
-        1: 600,
-        2: 700,
-        3: 800,
-    },
-    "gold": {
-        1: 900,
-        2: 1000,
-        3: 1100,
-    },
-    "emerald": {
-        1: 1200,
-        2: 1300,
-        3: 1400,
-    },
-    "diamond": {
-        1: 1500,
-        2: 1650,
-        3: 1800,
-    },
-    "netherite": {
-        1: 2000,
-    },
-}
 eos = False
 total_games = 0
 
 
-def get_rank(elo):
-    if not elo:
-        return None
-    last_rank = ""
-    for rank in RANKS:
-        for division in RANKS[rank]:
-            if elo < RANKS[rank][division]:
-                return last_rank
-            last_rank = f"{rank} {division}"
-    return last_rank
-
-
-async def get_completion_sample(id, season):
+async def get_completion_sample(scheduler, id, season):
     cut_matches = {}
     print(f"Fetching matches before {id} for season {season}")
-    matches = await api.RecentMatches(before=id, season=season, type=2, count=100).get_async()
+    matches = await scheduler.get(api.RecentMatches(before=id, season=season, type=2, count=100))
     for match in matches:
         global total_games
         total_games += 1
@@ -77,14 +37,18 @@ async def get_completion_sample(id, season):
                 if change["uuid"] == winner_uuid
             ), match["changes"][0]["eloRate"]
         )
-        winner_rank = get_rank(winner_elo)
         cut_matches[match["id"]] = {
             "date": match["date"],
             "time": match["result"]["time"],
             "elo": winner_elo,
-            "rank": winner_rank,
             "season": match["season"],
         }
+    # Whole sample classified at once
+    samples = list(cut_matches.values())
+    seasons = [sample["season"] for sample in samples]
+    codes = ranks.classify([sample["elo"] for sample in samples], seasons, divisions=True)
+    for sample, label in zip(samples, ranks.division_labels(codes, seasons)):
+        sample["rank"] = label
     return cut_matches
 
 
@@ -93,16 +57,13 @@ async def find_completions():
     season = 1
     all_matches = {}
     reached_end = False
+    scheduler = Scheduler()
     while not reached_end:
         ids = range(current_id, current_id + BATCH * INCREMENT, INCREMENT)
-        try:
-            match_groups = await asyncio.gather(
-                *[get_completion_sample(id, season) for id in ids]
-            )
-        except api.APIRateLimitError:
-            print("got rate limited, awaiting...")
-            await asyncio.sleep(610)
-            continue
+        match_groups = await asyncio.gather(
+            *[get_completion_sample(scheduler, id, season) for id in ids]
+        )
+        scheduler.report()
 
         for matches in match_groups:
             global eos
@@ -121,57 +82,57 @@ async def find_completions():
 def analyse(all_matches):
     games = {
         f"season {season}": {
-            f"{rank} {division}": len(
+            label: len(
                 [
                     match
                     for match in all_matches
-                    if match["rank"] == f"{rank} {division}"
+                    if match["rank"] == label
                     and match["season"] == season
                 ]
             )
-            for rank in RANKS for division in RANKS[rank]
+            for label in ranks.table(season).labels
         } for season in range(1, constants.SEASON + 1)
     }
     completions = {
         f"season {season}": {
-            f"{rank} {division}": len(
+            label: len(
                 [
                     match
                     for match in all_matches
-                    if match["rank"] == f"{rank} {division}"
+                    if match["rank"] == label
                     and match["season"] == season
                     and match["time"]
                 ]
             )
-            for rank in RANKS for division in RANKS[rank]
+            for label in ranks.table(season).labels
         } for season in range(1, constants.SEASON + 1)
     }
     avg_completion = {
         f"season {season}": {
-            f"{rank} {division}": int(np.mean(
+            label: int(np.mean(
                 [
                     match["time"]
                     for match in all_matches
-                    if match["rank"] == f"{rank} {division}"
+                    if match["rank"] == label
                     and match["season"] == season
                     and match["time"]
                 ]
-            )) if completions[f"season {season}"][f"{rank} {division}"] else None
-            for rank in RANKS for division in RANKS[rank]
+            )) if completions[f"season {season}"][label] else None
+            for label in ranks.table(season).labels
         } for season in range(1, constants.SEASON + 1)
     }
     med_completion = {
         f"season {season}": {
-            f"{rank} {division}": int(np.median(
+            label: int(np.median(
                 [
                     match["time"]
                     for match in all_matches
-                    if match["rank"] == f"{rank} {division}"
+                    if match["rank"] == label
                     and match["season"] == season
                     and match["time"]
                 ]
-            )) if completions[f"season {season}"][f"{rank} {division}"] else None
-            for rank in RANKS for division in RANKS[rank]
+            )) if completions[f"season {season}"][label] else None
+            for label in ranks.table(season).labels
         } for season in range(1, constants.SEASON + 1)
     }
 
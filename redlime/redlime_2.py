@@ -1,261 +1,349 @@
 import asyncio
 import json
+import os
 from pathlib import Path
 import sys
+import time
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 import numpy as np
 from rankedutils import api, constants, insight
+from videoutils import matchcache, ranks
+from videoutils.scheduler import Scheduler
 
 
 INCREMENT = 1000
 COUNT = 100
-BATCH = 5
-RANKS = {
-    "coal": {
-        1: 0,
-        2: 400,
-        3: 500,
-    },
-    "iron": {
-        1: 600,
-        2: 700,
-        3: 800,
-    },
-    "gold": {
-        1: 900,
-        2: 1000,
-        3: 1100,
-    },
-    "emerald": {
-        1: 1200,
-        2: 1300,
-        3: 1400,
-    },
-    "diamond": {
-        1: 1500,
-        2: 1650,
-        3: 1800,
-    },
-    "netherite": {
-        1: 2000,
-    },
-}
-eos = False
-total_runs = 0
-
-
-def get_rank(elo):
-    if not elo:
-        return None
-    last_rank = ""
-    for rank in RANKS:
-        for division in RANKS[rank]:
-            if elo < RANKS[rank][division]:
-                return last_rank
-            last_rank = f"{rank} {division}"
-    return last_rank
-
-
-async def get_splits_sample(id, season):
-    cut_runs = {}
-    print(f"Fetching matches before {id} for season {season}")
-    matches_simple = await api.RecentMatches(before=id, season=season, type=2, count=COUNT).get_async()
-    matches = await asyncio.gather(
-        *[api.Match(match_simple["id"]).get_async() for match_simple in matches_simple]
-    )
-    api.Match.commit()
+FIRST_SEASON = 5
+FETCHERS = 5
+# Pages in flight between stages, which is what bounds memory during the crawl
+QUEUE_SIZE = 10
+# Medians come from 1 s bins up to two hours, longer values land in the last bin
+MEDIAN_STEP = 1000
+MEDIAN_CLASSES = 7200
+SNAPSHOT_INTERVAL = 60
+# Adaptive mode pages ever finer through each season. Games and completions come from the page
+# listing for every run, but details are only fetched for runs in cells whose split means and
+# medians are not yet within TARGET_HALF_WIDTH ms. It never makes more calls per season than
+# the fixed INCREMENT grid would.
+ADAPTIVE_STRIDES = [INCREMENT, INCREMENT // 2, INCREMENT // 4]
+CONFIDENCE_Z = 1.96
+TARGET_HALF_WIDTH = 5000
+MIN_SAMPLES = 30
+OUTPUT_FILE = ROOT_DIR / "redlime" / "redlime.json"
+
+
+class CellStats:
+    # Running stats of one (season, division) cell, columns are the time then each split
+    # and 0 stands in for a missing value. The time comes from every listed run, the splits
+    # only from the `detailed` runs whose details were fetched
+
+    def __init__(self):
+        columns = len(constants.SPLITS) + 1
+        self.games = 0
+        self.detailed = 0
+        self.counts = np.zeros(columns, dtype=np.int64)
+        self.sums = np.zeros(columns, dtype=np.int64)
+        self.squares = np.zeros(columns, dtype=np.float64)
+        self.histogram = np.zeros((columns, MEDIAN_CLASSES), dtype=np.int32)
+
+    def add(self, rows, detailed=False):
+        if detailed:
+            self.detailed += len(rows)
+        else:
+            self.games += len(rows)
+        present = rows != 0
+        self.counts += present.sum(axis=0)
+        self.sums += rows.sum(axis=0)
+        self.squares += (rows.astype(np.float64) ** 2).sum(axis=0)
+        columns = np.broadcast_to(np.arange(rows.shape[1]), rows.shape)
+        bins = np.clip(rows // MEDIAN_STEP, 0, MEDIAN_CLASSES - 1)
+        np.add.at(self.histogram, (columns[present], bins[present]), 1)
+
+    def quantile(self, column, q):
+        # Interpolated within the bin holding the q-th value
+        counts = self.histogram[column]
+        target = self.counts[column] * q
+        cumulative = np.cumsum(counts)
+        i = min(int(np.searchsorted(cumulative, target)), MEDIAN_CLASSES - 1)
+        before = cumulative[i] - counts[i]
+        return (i + (target - before) / max(counts[i], 1)) * MEDIAN_STEP
+
+    def median(self, column):
+        return int(self.quantile(column, 0.5))
+
+    def half_width(self, column):
+        # Widest of the mean and median confidence intervals
+        count = self.counts[column]
+        if count < MIN_SAMPLES:
+            return np.inf
+        mean = self.sums[column] / count
+        mean_half_width = CONFIDENCE_Z * np.sqrt(max(self.squares[column] / count - mean ** 2, 0) / count)
+        # Order statistic interval around the median
+        spread = CONFIDENCE_Z / (2 * np.sqrt(count))
+        median_half_width = (self.quantile(column, min(0.5 + spread, 1)) - self.quantile(column, max(0.5 - spread, 0))) / 2
+        return max(mean_half_width, median_half_width)
+
+    def widest(self):
+        # The split furthest from converging
+        return max(range(1, len(self.counts)), key=self.half_width)
+
+    def converged(self):
+        return self.half_width(self.widest()) <= TARGET_HALF_WIDTH
+
+    def summary(self, column):
+        count = int(self.counts[column])
+        if not count:
+            return 0, None, None
+        mean = int(self.sums[column] / count)
+        if column:
+            # Scaled from the detailed runs up to every game in the cell, exact when all were fetched
+            count = round(count * self.games / self.detailed)
+        return count, mean, self.median(column)
+
+
+class SeasonBudget:
+    # Calls the fixed INCREMENT grid makes for a season, which adaptive mode never exceeds
+
+    def __init__(self, season):
+        self.season = season
+        self.calls = len(page_ids(season, INCREMENT)) * (COUNT + 1)
+        self.total_pages = len(set().union(*[page_ids(season, stride) for stride in ADAPTIVE_STRIDES]))
+        self.pages = 0
+        self.spent = 0
+
+    def remaining(self):
+        return max(self.calls - self.spent, 0)
+
+    def settled(self, cell):
+        # Converged, or so rare that the pages left won't get it there at its current rate
+        if cell.converged():
+            return True
+        if not self.pages:
+            return False
+        column = cell.widest()
+        count = cell.counts[column]
+        needed = MIN_SAMPLES if count < MIN_SAMPLES else count * (cell.half_width(column) / TARGET_HALF_WIDTH) ** 2
+        projected = count + count / self.pages * (self.total_pages - self.pages)
+        return projected < needed
+
+    def done(self, cells):
+        season_cells = [cell for (season, _), cell in cells.items() if season == self.season]
+        return not self.remaining() or (bool(season_cells) and all(self.settled(cell) for cell in season_cells))
+
+
+def run_elos(match):
+    return [
+        next(
+            (
+                change["eloRate"]
+                for change in match["changes"]
+                if change["uuid"] == player["uuid"]
+            ), match["changes"][0]["eloRate"]
+        )
+        for player in match["players"]
+    ]
+
+
+def open_runs(cells, match):
+    # uuids of the runs whose cell still needs samples, from the page listing alone
+    codes = ranks.classify(run_elos(match), match["season"], divisions=True).tolist()
+    return {
+        player["uuid"]
+        for player, code in zip(match["players"], codes)
+        if code != ranks.UNRANKED and not ((match["season"], code) in cells and cells[(match["season"], code)].converged())
+    }
+
+
+def listed_runs(matches):
+    # (season, elo, [time, 0, ...]) for every run in a page listing
     for match in matches:
+        match_time = match["result"]["time"] if match["forfeited"] is False else None
+        for elo in run_elos(match):
+            yield match["season"], elo, [match_time or 0] + [0] * len(constants.SPLITS)
+
+
+def detailed_runs(details, keep=None):
+    # (season, elo, [0, *splits]) for every run (or only the uuids in `keep`) of the match details
+    for match in details:
         split_times = insight.get_splits_naive(match)
-        for i, player in enumerate(match["players"]):
-            global total_runs
-            total_runs += 1
-            if match["id"] + INCREMENT > constants.FINAL_MATCHES[season] or id > constants.FINAL_MATCHES[season]:
-                global eos
-                eos = True
+        for player, elo in zip(match["players"], run_elos(match)):
             uuid = player["uuid"]
-            elo = next(
-                (
-                    change["eloRate"]
-                    for change in match["changes"]
-                    if change["uuid"] == uuid
-                ), match["changes"][0]["eloRate"]
-            )
-            rank = get_rank(elo)
-            cut_runs[f"{match['id']}{chr(ord('a') + i)}"] = {
-                "date": match["date"],
-                "time": match["result"]["time"] if match["forfeited"] is False else None,
-                "elo": elo,
-                "rank": rank,
-                "season": match["season"],
-                "splits": split_times[uuid]
-            }
-    return cut_runs
-
-
-async def find_completions():
-    season = 5
-    current_id = constants.FIRST_MATCHES[season] + COUNT
-    all_runs = {}
-    reached_end = False
-    while not reached_end:
-        ids = range(current_id, current_id + BATCH * INCREMENT, INCREMENT)
-        try:
-            run_groups = await asyncio.gather(
-                *[get_splits_sample(id, season) for id in ids]
-            )
-        except api.APIRateLimitError:
-            print("got rate limited, awaiting...")
-            await asyncio.sleep(610)
+            if keep is not None and uuid not in keep[match["id"]]:
+                continue
+            yield match["season"], elo, [0] + [split_times[uuid][split] or 0 for split in constants.SPLITS]
+
+
+def classify_runs(runs):
+    seasons, elos, rows = zip(*runs) if runs else ((), (), ())
+    codes = ranks.classify(list(elos), np.array(seasons, dtype=np.int64), divisions=True)
+    return np.array(seasons, dtype=np.int64), codes, np.array(rows, dtype=np.int64).reshape(len(rows), len(constants.SPLITS) + 1)
+
+
+def parse_page(matches, details, seen, keep=None):
+    # Listed and detailed runs of the matches not seen yet, each as seasons, division codes and rows
+    new = [match for match in matches if match["id"] not in seen]
+    new_ids = {match["id"] for match in new}
+    seen.update(new_ids)
+    return (
+        classify_runs(list(listed_runs(new))),
+        classify_runs(list(detailed_runs([match for match in details if match["id"] in new_ids], keep))),
+    )
+
+
+def page_ids(season, stride):
+    return range(constants.FIRST_MATCHES[season] + COUNT, constants.FINAL_MATCHES[season] + INCREMENT, stride)
+
+
+async def produce_pages(pages, cells, budgets, adaptive):
+    for season in range(FIRST_SEASON, constants.SEASON + 1):
+        visited = set()
+        for level, stride in enumerate(ADAPTIVE_STRIDES if adaptive else [INCREMENT]):
+            # Finer strides only fill the gaps of coarser ones, so stopping early still spans the season.
+            # The coarsest pass always runs so rare divisions get a chance to show up
+            for id in page_ids(season, stride):
+                if id in visited:
+                    continue
+                if level and budgets[season].done(cells):
+                    break
+                visited.add(id)
+                await pages.put((season, id))
+    for _ in range(FETCHERS):
+        await pages.put(None)
+
+
+async def fetch_pages(scheduler, pages, matches, cells, budgets, adaptive):
+    skipped = 0
+    while (page := await pages.get()) is not None:
+        season, id = page
+        budget = budgets[season]
+        # Pages queued before the budget ran out
+        if adaptive and not budget.remaining():
             continue
-        except:
-            print("other error continueing", ids)
-
-        for runs in run_groups:
-            global eos
-            if eos:
-                season += 1
-                current_id -= BATCH * INCREMENT
-                eos = False
-                if season > constants.SEASON:
-                    reached_end = True
-            all_runs.update(runs)
-        current_id += BATCH * INCREMENT
-
-    print(json.dumps(all_runs, indent=4))
-    return sorted(list(all_runs.values()), key=lambda x: x["date"])
-
-
-def analyse(all_runs):
-    games = {
-        f"season {season}": {
-            f"{rank} {division}": len(
-                [
-                    run
-                    for run in all_runs
-                    if run["rank"] == f"{rank} {division}"
-                    and run["season"] == season
-                ]
-            )
-            for rank in RANKS for division in RANKS[rank]
-        } for season in range(1, constants.SEASON + 1)
-    }
-    completions = {
-        f"season {season}": {
-            f"{rank} {division}": len(
-                [
-                    run
-                    for run in all_runs
-                    if run["rank"] == f"{rank} {division}"
-                    and run["season"] == season
-                    and run["time"]
-                ]
-            )
-            for rank in RANKS for division in RANKS[rank]
-        } for season in range(1, constants.SEASON + 1)
-    }
-    avg_completion = {
-        f"season {season}": {
-            f"{rank} {division}": int(np.mean(
-                [
-                    run["time"]
-                    for run in all_runs
-                    if run["rank"] == f"{rank} {division}"
-                    and run["season"] == season
-                    and run["time"]
-                ]
-            )) if completions[f"season {season}"][f"{rank} {division}"] else None
-            for rank in RANKS for division in RANKS[rank]
-        } for season in range(1, constants.SEASON + 1)
-    }
-    med_completion = {
-        f"season {season}": {
-            f"{rank} {division}": int(np.median(
-                [
-                    run["time"]
-                    for run in all_runs
-                    if run["rank"] == f"{rank} {division}"
-                    and run["season"] == season
-                    and run["time"]
-                ]
-            )) if completions[f"season {season}"][f"{rank} {division}"] else None
-            for rank in RANKS for division in RANKS[rank]
-        } for season in range(1, constants.SEASON + 1)
-    }
-    split_completed = {
-        f"season {season}": {
-            f"{rank} {division}": {
-                split: len(
-                    [
-                        run["splits"][split]
-                        for run in all_runs
-                        if run["rank"] == f"{rank} {division}"
-                        and run["season"] == season
-                        and run["splits"][split]
-                    ]
-                )
-                for split in constants.SPLITS
-            }
-            for rank in RANKS for division in RANKS[rank]
-        } for season in range(1, constants.SEASON + 1)
-    }
-    avg_split = {
-        f"season {season}": {
-            f"{rank} {division}": {
-                split: int(np.mean(
-                    [
-                        run["splits"][split]
-                        for run in all_runs
-                        if run["rank"] == f"{rank} {division}"
-                        and run["season"] == season
-                        and run["splits"][split]
-                    ]
-                )) if split_completed[f"season {season}"][f"{rank} {division}"][split] else None
-                for split in constants.SPLITS
-            }
-            for rank in RANKS for division in RANKS[rank]
-        } for season in range(1, constants.SEASON + 1)
-    }
-    med_split = {
-        f"season {season}": {
-            f"{rank} {division}": {
-                split: int(np.median(
-                    [
-                        run["splits"][split]
-                        for run in all_runs
-                        if run["rank"] == f"{rank} {division}"
-                        and run["season"] == season
-                        and run["splits"][split]
-                    ]
-                )) if split_completed[f"season {season}"][f"{rank} {division}"][split] else None
-                for split in constants.SPLITS
-            }
-            for rank in RANKS for division in RANKS[rank]
-        } for season in range(1, constants.SEASON + 1)
+        # Spent before the call so the other fetchers see it
+        budget.spent += 1
+        print(f"Fetching matches before {id} for season {season}")
+        matches_simple = await scheduler.get(api.RecentMatches(before=id, season=season, type=2, count=COUNT))
+        budget.pages += 1
+        keep = None
+        detail_ids = [match_simple["id"] for match_simple in matches_simple]
+        if adaptive:
+            keep = {match_simple["id"]: open_runs(cells, match_simple) for match_simple in matches_simple}
+            # Trimmed to what is left of the budget, pages already queued can't overshoot it
+            detail_ids = [match_id for match_id in detail_ids if keep[match_id]][:budget.remaining()]
+            skipped += len(keep) - len(detail_ids)
+            budget.spent += len(detail_ids)
+        details = await matchcache.gather(detail_ids, scheduler)
+        api.Match.commit()
+        await matches.put((season, matches_simple, details, keep))
+    await matches.put(None)
+    return skipped
+
+
+async def parse_pages(matches, results):
+    # Match ids of each season, to drop the repeats near its end. Pages only repeat within a
+    # season, so once the next one starts only the previous season's stragglers still need theirs
+    seen = {}
+    finished = 0
+    while finished < FETCHERS:
+        page = await matches.get()
+        if page is None:
+            finished += 1
+            continue
+        season, matches_simple, details, keep = page
+        if season not in seen:
+            seen = {old: ids for old, ids in seen.items() if old >= season - 1}
+        await results.put(parse_page(matches_simple, details, seen.setdefault(season, set()), keep))
+    await results.put(None)
+
+
+async def aggregate(scheduler, results, cells):
+    last_snapshot = time.monotonic()
+    while (result := await results.get()) is not None:
+        listed, detailed = result
+        fold(cells, *listed)
+        fold(cells, *detailed, detailed=True)
+        if time.monotonic() - last_snapshot > SNAPSHOT_INTERVAL:
+            write_stats(cell_stats(cells))
+            scheduler.report()
+            last_snapshot = time.monotonic()
+    return cells
+
+
+def fold(cells, seasons, codes, rows, detailed=False):
+    for season, code in set(zip(seasons.tolist(), codes.tolist())):
+        if code == ranks.UNRANKED:
+            continue
+        in_cell = (seasons == season) & (codes == code)
+        cells.setdefault((season, code), CellStats()).add(rows[in_cell], detailed)
+
+
+async def crawl(adaptive=False):
+    scheduler = Scheduler()
+    cells = {}
+    budgets = {season: SeasonBudget(season) for season in range(FIRST_SEASON, constants.SEASON + 1)}
+    pages = asyncio.Queue(QUEUE_SIZE)
+    matches = asyncio.Queue(QUEUE_SIZE)
+    results = asyncio.Queue(QUEUE_SIZE)
+    _, *skipped, _, _ = await asyncio.gather(
+        produce_pages(pages, cells, budgets, adaptive),
+        *[fetch_pages(scheduler, pages, matches, cells, budgets, adaptive) for _ in range(FETCHERS)],
+        parse_pages(matches, results),
+        aggregate(scheduler, results, cells),
+    )
+    scheduler.report()
+    if adaptive:
+        print(f"Skipped {sum(skipped)} match details of converged or unranked runs")
+    return cells
+
+
+def cell_stats(cells):
+    empty = CellStats()
+    stats = {
+        "games": {},
+        "completions": {},
+        "mean_completion": {},
+        "median_completion": {},
+        "split_completed": {},
+        "mean_split": {},
+        "median_split": {},
     }
+    for season in range(1, constants.SEASON + 1):
+        season_key = f"season {season}"
+        for stat in stats.values():
+            stat[season_key] = {}
+        for code, label in enumerate(ranks.table(season).labels):
+            cell = cells.get((season, code), empty)
+            stats["games"][season_key][label] = cell.games
+            (
+                stats["completions"][season_key][label],
+                stats["mean_completion"][season_key][label],
+                stats["median_completion"][season_key][label],
+            ) = cell.summary(0)
+            for stat in ("split_completed", "mean_split", "median_split"):
+                stats[stat][season_key][label] = {}
+            for i, split in enumerate(constants.SPLITS, 1):
+                (
+                    stats["split_completed"][season_key][label][split],
+                    stats["mean_split"][season_key][label][split],
+                    stats["median_split"][season_key][label][split],
+                ) = cell.summary(i)
+    return stats
 
-    with open(ROOT_DIR / "redlime" / "redlime.json", "w") as f:
-        json.dump(
-            {
-                "games": games,
-                "completions": completions,
-                "mean_completion": avg_completion,
-                "median_completion": med_completion,
-                "split_completed": split_completed,
-                "mean_split": avg_split,
-                "median_split": med_split,
-            },
-            f,
-            indent=4
-        )
 
+def write_stats(stats):
+    # Written in place of the old file so partial results can be read mid-crawl
+    tmp = OUTPUT_FILE.with_name(f"{OUTPUT_FILE.name}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(stats, f, indent=4)
+    os.replace(tmp, OUTPUT_FILE)
 
 
-def main():
-    all_runs = asyncio.run(find_completions())
-    analyse(all_runs)
+def main(adaptive=False):
+    cells = asyncio.run(crawl(adaptive))
+    write_stats(cell_stats(cells))
 
 
 if __name__ == "__main__":
-    main()
+    main(len(sys.argv) > 1 and sys.argv[1] == "adaptive")
@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import aiohttp
+
+from videoutils.constants import CACHE_DIR
+
+
+AVATAR_DIR = CACHE_DIR / "avatars"
+BLOB_DIR = AVATAR_DIR / "blobs"
+INDEX_FILE = AVATAR_DIR / "index.json"
+AVATAR_URL = "https://mc-heads.net/avatar/{key}"
+# Heads checked more recently than this are used without asking the server
+MAX_AGE = 7 * 86400
+MAX_IN_FLIGHT = 10
+
+
+def read_index():
+    if not INDEX_FILE.exists():
+        return {}
+    return json.loads(INDEX_FILE.read_text())
+
+
+def write_index(index):
+    AVATAR_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = INDEX_FILE.with_name(f"{INDEX_FILE.name}.tmp")
+    tmp.write_text(json.dumps(index, indent=4))
+    os.replace(tmp, INDEX_FILE)
+
+
+def blob_path(digest):
+    return BLOB_DIR / f"{digest}.png"
+
+
+def store_blob(content):
+    digest = hashlib.sha256(content).hexdigest()
+    path = blob_path(digest)
+    if not path.exists():
+        BLOB_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{digest}.tmp")
+        tmp.write_bytes(content)
+        os.replace(tmp, path)
+    return digest
+
+
+def avatar_key(identifier, size=None):
+    return f"{identifier}/{size}" if size else str(identifier)
+
+
+async def refresh(session, semaphore, key, entry):
+    headers = {}
+    if entry and blob_path(entry["hash"]).exists():
+        if time.time() - entry["checked"] < MAX_AGE:
+            return entry
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    else:
+        entry = None
+
+    async with semaphore:
+        async with session.get(AVATAR_URL.format(key=key), headers=headers) as response:
+            if response.status == 304 and entry:
+                return {**entry, "checked": time.time()}
+            response.raise_for_status()
+            content = await response.read()
+            return {
+                "hash": store_blob(content),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "checked": time.time(),
+            }
+
+
+async def prefetch(identifiers, size=None, max_in_flight=MAX_IN_FLIGHT):
+    # Returns {identifier: blob path}, only downloading heads that are new or have changed
+    index = read_index()
+    keys = {identifier: avatar_key(identifier, size) for identifier in dict.fromkeys(identifiers)}
+    semaphore = asyncio.Semaphore(max_in_flight)
+    async with aiohttp.ClientSession() as session:
+        entries = await asyncio.gather(
+            *[refresh(session, semaphore, key, index.get(key)) for key in keys.values()]
+        )
+    index.update(zip(keys.values(), entries))
+    write_index(index)
+    return {identifier: blob_path(index[key]["hash"]) for identifier, key in keys.items()}
+
+
+def link(source, destination):
+    if destination.exists() and os.path.samefile(source, destination):
+        return
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destination.with_name(f"{destination.stem}.tmp.png")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, destination)
+
+
+async def save_avatars(names, assets_dir, size=None):
+    # names maps the file name to use in assets_dir onto the uuid (or nick) to fetch the head for
+    blobs = await prefetch(names.values(), size)
+    for name, identifier in names.items():
+        link(blobs[identifier], assets_dir / f"{name}.png")
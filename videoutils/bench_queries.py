@@ -0,0 +1,74 @@
+from pathlib import Path
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from rankedutils import db
+from videoutils import query
+
+
+# The old per-match runs queries are timed on this many matches and extrapolated
+PER_MATCH_SAMPLE = 200
+# The match queries each analysis makes, and whether it then pulls the runs of those matches
+WORKLOADS = {
+    "process_times": ("id, result_uuid, time, forfeited", {"bastionType": "BRIDGE", "type": 2, "decayed": False}, True),
+    "split_ratio": ("id, result_uuid, time", {"type": 2, "forfeited": False, "decayed": False, "season": 7}, True),
+    "avg_bt": ("id", {"seedType": "BURIED_TREASURE", "type": 2, "decayed": False}, True),
+    "load_games ranked": ("id, seedType, bastionType, tag", {"type": 2, "season": 7, "decayed": False}, False),
+    "load_games tags": ("id, seedType, bastionType, tag", {"tag": "playoffs_s5_r1"}, False),
+}
+
+
+def copy_without_indexes(conn, path):
+    # The db as the scripts used to see it, keeping whatever indexes its own schema has
+    target = sqlite3.connect(path)
+    conn.backup(target)
+    for table, columns in query.INDEXES:
+        target.execute(f"DROP INDEX IF EXISTS {query.index_name(table, columns)}")
+    target.commit()
+    return target
+
+
+def run_before(cursor, items, filters, with_runs):
+    # db.query_db for the matches, then one runs query per match like the scripts did
+    start = time.perf_counter()
+    matches = db.query_db(cursor, items=items, **filters)
+    elapsed = time.perf_counter() - start
+    if with_runs and matches:
+        sample = matches[:PER_MATCH_SAMPLE]
+        start = time.perf_counter()
+        for match in sample:
+            db.query_db(cursor, table="runs", items="eloRate, player_uuid", match_id=match[0])
+        elapsed += (time.perf_counter() - start) / len(sample) * len(matches)
+    return elapsed
+
+
+def run_after(cursor, items, filters, with_runs):
+    start = time.perf_counter()
+    matches = db.query_db(cursor, items=items, **filters)
+    if with_runs:
+        for _ in query.iter_match_runs(cursor, matches, items="eloRate, player_uuid"):
+            pass
+    return time.perf_counter() - start, len(matches)
+
+
+def main(db_name=None):
+    conn, cursor = query.connect(db_name)
+    with tempfile.TemporaryDirectory() as tmp:
+        print("Copying the db without the added indexes")
+        baseline = copy_without_indexes(conn, Path(tmp) / "baseline.db")
+        print(f"{'workload':<20}{'matches':>9}{'before':>10}{'after':>10}{'speedup':>9}")
+        for name, (items, filters, with_runs) in WORKLOADS.items():
+            before = run_before(baseline.cursor(), items, filters, with_runs)
+            after, match_count = run_after(cursor, items, filters, with_runs)
+            print(f"{name:<20}{match_count:>9}{before:>9.3f}s{after:>9.3f}s{before / after:>8.1f}x")
+        baseline.close()
+    print(f"Per-match runs queries extrapolated from the first {PER_MATCH_SAMPLE} matches")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
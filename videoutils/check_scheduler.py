@@ -0,0 +1,81 @@
+import asyncio
+from pathlib import Path
+import sys
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import aiohttp
+from rankedutils import api
+from videoutils.scheduler import Scheduler
+
+
+class FakeRequest:
+    # Stands in for an api request, raising each of `errors` on successive calls before answering
+
+    def __init__(self, response, errors=()):
+        self.response = response
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def get_async(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.response
+
+
+async def check_retries():
+    scheduler = Scheduler(rate=1000, burst=1000, max_retries=3, base_delay=0.01, max_delay=0.05)
+    ok = [FakeRequest(i) for i in range(20)]
+    limited = FakeRequest("limited", [api.APIRateLimitError()])
+    flaky = FakeRequest("flaky", [aiohttp.ClientError(), asyncio.TimeoutError()])
+    assert await scheduler.gather(ok + [limited, flaky]) == list(range(20)) + ["limited", "flaky"]
+    # Only the failed calls are made again
+    assert [request.calls for request in ok] == [1] * 20
+    assert limited.calls == 2 and flaky.calls == 3
+    stats = scheduler.stats()
+    assert stats["requests"] == 22 and stats["retries"] == 3 and stats["rate_limits"] == 1
+    assert stats["failures"] == 0
+
+
+async def check_failures():
+    scheduler = Scheduler(rate=1000, burst=1000, max_retries=2, base_delay=0.01, max_delay=0.05)
+    # Errors outside RETRY_ERRORS are raised straight away
+    missing = FakeRequest(None, [api.APINotFoundError()])
+    try:
+        await scheduler.get(missing)
+    except api.APINotFoundError:
+        pass
+    else:
+        raise AssertionError("APINotFoundError was swallowed")
+    assert missing.calls == 1 and scheduler.retries == 0
+    # Retries stop after max_retries and the last error is raised
+    down = FakeRequest(None, [aiohttp.ClientError()] * 5)
+    try:
+        await scheduler.get(down)
+    except aiohttp.ClientError:
+        pass
+    else:
+        raise AssertionError("ClientError was swallowed")
+    assert down.calls == 3 and scheduler.retries == 2 and scheduler.failures == 1
+
+
+async def check_rate_cut():
+    # A burst of rate limits halves the rate once, not once per request
+    scheduler = Scheduler(rate=1000, burst=1000, base_delay=0.2, max_delay=0.2)
+    requests = [FakeRequest(i, [api.APIRateLimitError()]) for i in range(10)]
+    await scheduler.gather(requests)
+    assert scheduler.rate_limits == 10
+    assert scheduler.rate == min(1000, 500 + 10 * 1000 / 100)
+
+
+def main():
+    for check in (check_retries, check_failures, check_rate_cut):
+        asyncio.run(check())
+        print(f"{check.__name__} ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+DEATH_TYPES = {"projectelo.timeline.death", "projectelo.timeline.reset"}
+
+
+def dead_players(match):
+    # uuids with at least one death or reset in the match, from one scan of the timeline
+    return {event["uuid"] for event in match["timelines"] if event["type"] in DEATH_TYPES}
+
+
+def rate(deaths, total):
+    return round(deaths / total * 100, 1) if total else None
+
+
+def player_stats(uuid, matches):
+    deaths = sum(uuid in dead_players(match) for match in matches)
+    return {
+        "games": len(matches),
+        "deaths": deaths,
+        "death_rate": rate(deaths, len(matches)),
+    }
+
+
+def match_stats(matches):
+    # Every match is two runs, each counted as a death at most once
+    runs = 0
+    deaths = 0
+    for match in matches:
+        runs += len(match["players"])
+        deaths += len(dead_players(match) & {player["uuid"] for player in match["players"]})
+    return {
+        "runs": runs,
+        "deaths": deaths,
+        "death_rate": rate(deaths, runs),
+    }
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+from rankedutils import api
+
+from videoutils.constants import CACHE_DIR
+from videoutils.scheduler import Scheduler
+
+
+LOG_DIR = CACHE_DIR / "user_matches"
+DAY = 86400
+FIRST_BEFORE = 10000000
+
+
+def log_path(uuid, season):
+    return LOG_DIR / str(season) / f"{uuid}.json"
+
+
+def read_log(uuid, season):
+    path = log_path(uuid, season)
+    if not path.exists():
+        return []
+    return json.loads(path.read_text())
+
+
+def write_log(uuid, season, log):
+    path = log_path(uuid, season)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(json.dumps(log))
+    os.replace(tmp, path)
+
+
+def elo_after(match, uuid):
+    for change in match["changes"]:
+        if change["uuid"] == uuid and change["eloRate"] is not None and change["change"] is not None:
+            return change["eloRate"] + change["change"]
+    return None
+
+
+async def update_log(uuid, season, scheduler):
+    # Logs are [id, date, elo after the match] newest first, so only pages newer than the head are fetched
+    log = read_log(uuid, season)
+    newest_id = log[0][0] if log else 0
+    new_entries = []
+    last_id = FIRST_BEFORE
+    while True:
+        response_data = await scheduler.get(
+            api.UserMatches(uuid, before=last_id, season=season, type=2, excludedecay=False)
+        )
+        if not response_data:
+            break
+        last_id = response_data[-1]["id"]
+        for match in response_data:
+            if match["id"] <= newest_id:
+                break
+            elo = elo_after(match, uuid)
+            if elo is not None:
+                new_entries.append([match["id"], match["date"], elo])
+        else:
+            continue
+        break
+
+    log = new_entries + log
+    if new_entries:
+        write_log(uuid, season, log)
+    return log
+
+
+async def load_logs(uuids, seasons, scheduler=None):
+    scheduler = scheduler or Scheduler()
+    keys = [(uuid, season) for uuid in uuids for season in seasons]
+    logs = await asyncio.gather(*[update_log(uuid, season, scheduler) for uuid, season in keys])
+    scheduler.report()
+    return dict(zip(keys, logs))
+
+
+def elo_matrix(logs, uuids, seasons, season_end, min_days=0):
+    # Columns run oldest to newest day, counted back from season_end; each player's elo is the
+    # last one of the day, carried forward until the end of that season but never into the next
+    player_index = {uuid: i for i, uuid in enumerate(uuids)}
+    rows = [
+        (player_index[uuid], season, *entry)
+        for (uuid, season), log in logs.items()
+        if uuid in player_index and season in seasons
+        for entry in log
+    ]
+    entries = np.array(rows, dtype=np.int64).reshape(-1, 5)
+    players, match_seasons, ids, dates, elos = entries.T
+    days = (season_end - dates) // DAY
+    valid = days >= 0
+    players, match_seasons, ids, days, elos = (
+        column[valid] for column in (players, match_seasons, ids, days, elos)
+    )
+
+    day_count = max(min_days, int(days.max()) + 1 if len(days) else 0)
+    columns = day_count - 1 - days
+    matrix = np.full((len(uuids), day_count), np.nan)
+
+    # Latest match per (player, day) wins
+    order = np.lexsort((ids, columns, players))
+    players, columns, match_seasons, elos = players[order], columns[order], match_seasons[order], elos[order]
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (players[1:] != players[:-1]) | (columns[1:] != columns[:-1])
+    matrix[players[last], columns[last]] = elos[last]
+
+    latest_season = max(seasons)
+    for season in seasons:
+        in_season = match_seasons == season
+        if not in_season.any():
+            continue
+        start = columns[in_season].min()
+        end = day_count if season == latest_season else columns[in_season].max() + 1
+        block = matrix[:, start:end]
+        filled = np.where(~np.isnan(block), np.arange(end - start), 0)
+        np.maximum.accumulate(filled, axis=1, out=filled)
+        matrix[:, start:end] = block[np.arange(len(uuids))[:, None], filled]
+
+    return matrix
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def classes_of(values, x_min, step):
+    return np.floor((np.asarray(values, dtype=np.float64) - x_min) / step).astype(np.int64)
+
+
+def counts(values, x_min, step, classes, weight=1):
+    bins = classes_of(values, x_min, step)
+    bins = bins[(bins >= 0) & (bins < classes)]
+    return np.bincount(bins, minlength=classes) * weight
+
+
+def batch_counts(groups, x_min, step, classes, weight=1):
+    # One bincount over every group, offsetting each group's bins into its own row
+    sizes = [len(values) for values in groups]
+    values = np.concatenate([np.asarray(values, dtype=np.float64) for values in groups]) if groups else np.empty(0)
+    rows = np.repeat(np.arange(len(groups)), sizes)
+    bins = classes_of(values, x_min, step)
+    valid = (bins >= 0) & (bins < classes)
+    flat = np.bincount(rows[valid] * classes + bins[valid], minlength=len(groups) * classes)
+    return flat.reshape(len(groups), classes) * weight
+
+
+def smooth(counts, sigma_bins):
+    # Gaussian kernel over +-4 sigma, clipped so the tails never dip below zero
+    kernel_size = int(max(3, sigma_bins * 8)) | 1
+    xs = np.linspace(-4 * sigma_bins, 4 * sigma_bins, kernel_size)
+    kernel = np.exp(-0.5 * (xs / sigma_bins) ** 2)
+    kernel /= kernel.sum()
+    counts = np.atleast_2d(np.asarray(counts, dtype=np.float64))
+    smoothed = np.array([np.convolve(row, kernel, mode="same") for row in counts])
+    return np.clip(smoothed, 0.0, None)
+
+
+def summarise(values, x_min, step, classes, percentiles=(), weight=1, sigma_bins=None):
+    return batch({None: values}, x_min, step, classes, percentiles, weight, sigma_bins)[None]
+
+
+def batch(groups, x_min, step, classes, percentiles=(), weight=1, sigma_bins=None):
+    names = list(groups)
+    values = [np.asarray(groups[name], dtype=np.float64) for name in names]
+    all_counts = batch_counts(values, x_min, step, classes, weight)
+    smoothed = smooth(all_counts, sigma_bins) if sigma_bins else [None] * len(names)
+
+    summaries = {}
+    for name, group, group_counts, group_smoothed in zip(names, values, all_counts, smoothed):
+        median = np.median(group) if len(group) else None
+        summaries[name] = {
+            "counts": group_counts,
+            "median": median,
+            "median_class": int(classes_of(median, x_min, step)) if median is not None else None,
+            "percentiles": [np.percentile(group, p) for p in percentiles] if len(group) else [],
+            "smoothed": group_smoothed,
+        }
+    return summaries
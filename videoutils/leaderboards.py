@@ -0,0 +1,70 @@
+import json
+import os
+
+import aiohttp
+
+from videoutils import matchcache
+from videoutils.constants import CACHE_DIR
+from videoutils.scheduler import Scheduler
+
+
+API_URL = "https://mcsrranked.com/api"
+SEED_INDEX_FILE = CACHE_DIR / "leaderboards" / "seed_types.json"
+
+
+class RecordLeaderboard:
+
+    def __init__(self, session, season=None):
+        self.session = session
+        self.season = season
+
+    async def get_async(self):
+        params = {"season": self.season} if self.season else {}
+        async with self.session.get(f"{API_URL}/record-leaderboard", params=params) as response:
+            response.raise_for_status()
+            return (await response.json())["data"]
+
+
+def read_seed_index():
+    if not SEED_INDEX_FILE.exists():
+        return {}
+    return {int(match_id): seed_type for match_id, seed_type in json.loads(SEED_INDEX_FILE.read_text()).items()}
+
+
+def write_seed_index(index):
+    SEED_INDEX_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = SEED_INDEX_FILE.with_name(f"{SEED_INDEX_FILE.name}.tmp")
+    tmp.write_text(json.dumps(index))
+    os.replace(tmp, SEED_INDEX_FILE)
+
+
+async def leaderboard_ids(scheduler, seasons, max_time):
+    # The lifetime board plus every season board, deduped
+    async with aiohttp.ClientSession() as session:
+        boards = await scheduler.gather(
+            [RecordLeaderboard(session)] + [RecordLeaderboard(session, season) for season in seasons]
+        )
+    return list(dict.fromkeys(
+        match["id"]
+        for board in boards
+        for match in board
+        if match["time"] < max_time
+    ))
+
+
+async def find_runs(seed_type, max_time, seasons=range(1, 9)):
+    # Leaderboard matches under max_time on the given seed type, with their full details
+    scheduler = Scheduler()
+    match_ids = await leaderboard_ids(scheduler, seasons, max_time)
+
+    index = read_seed_index()
+    unknown = [match_id for match_id in match_ids if match_id not in index]
+    if unknown:
+        for match_id, match in zip(unknown, await matchcache.gather(unknown, scheduler)):
+            index[match_id] = match["seedType"]
+        write_seed_index(index)
+
+    wanted = [match_id for match_id in match_ids if index[match_id] == seed_type]
+    matches = await matchcache.gather(wanted, scheduler)
+    scheduler.report()
+    return matches
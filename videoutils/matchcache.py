@@ -0,0 +1,100 @@
+import asyncio
+import gzip
+import json
+import os
+
+from rankedutils import api
+
+from videoutils.constants import CACHE_DIR
+
+
+MATCH_DIR = CACHE_DIR / "matches"
+MAX_SIZE = 2 * 1024 ** 3
+# Bytes written between eviction passes
+EVICT_INTERVAL = 64 * 1024 ** 2
+# Above any match id, for the first page of a listing
+FIRST_BEFORE = 10000000
+_written = 0
+
+
+def match_path(match_id):
+    return MATCH_DIR / f"{int(match_id) % 256:02x}" / f"{match_id}.json.gz"
+
+
+def read(match_id):
+    path = match_path(match_id)
+    try:
+        with gzip.open(path, "rt") as f:
+            match = json.load(f)
+    except (FileNotFoundError, EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+        return None
+    # Reads count as use for the LRU eviction
+    os.utime(path)
+    return match
+
+
+def write(match_id, match):
+    global _written
+    path = match_path(match_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp")
+    with gzip.open(tmp, "wt") as f:
+        json.dump(match, f)
+    os.replace(tmp, path)
+    _written += path.stat().st_size
+    if _written > EVICT_INTERVAL:
+        evict()
+
+
+def evict(max_size=MAX_SIZE):
+    global _written
+    _written = 0
+    if not MATCH_DIR.exists():
+        return 0
+    files = [(path.stat(), path) for path in MATCH_DIR.glob("*/*.json.gz")]
+    total = sum(stat.st_size for stat, _ in files)
+    removed = 0
+    # Drop down to 90% so evictions don't run on every write once full
+    for stat, path in sorted(files, key=lambda file: file[0].st_mtime):
+        if total <= max_size * 0.9:
+            break
+        path.unlink(missing_ok=True)
+        total -= stat.st_size
+        removed += 1
+    return removed
+
+
+def get(match_id):
+    match = read(match_id)
+    if match is None:
+        match = api.Match(match_id).get()
+        write(match_id, match)
+    return match
+
+
+async def get_async(match_id, scheduler=None):
+    match = read(match_id)
+    if match is None:
+        request = api.Match(match_id)
+        match = await (scheduler.get(request) if scheduler else request.get_async())
+        write(match_id, match)
+    return match
+
+
+async def gather(match_ids, scheduler=None):
+    return await asyncio.gather(*[get_async(match_id, scheduler) for match_id in match_ids])
+
+
+async def user_matches(uuid, season, scheduler, limit=None):
+    # Details of a player's ranked matches in a season, newest first, one listing page at a time
+    matches = []
+    before = FIRST_BEFORE
+    while limit is None or len(matches) < limit:
+        listing = await scheduler.get(api.UserMatches(uuid, before=before, season=season, type=2))
+        if not listing:
+            break
+        before = listing[-1]["id"]
+        if limit is not None:
+            listing = listing[:limit - len(matches)]
+        matches += await gather([match["id"] for match in listing], scheduler)
+    return matches
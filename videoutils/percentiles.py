@@ -0,0 +1,190 @@
+import json
+import os
+from pathlib import Path
+import shutil
+
+import numpy as np
+
+from videoutils import query, splits, timelines
+from videoutils.constants import CACHE_DIR
+
+
+PERCENTILE_DIR = CACHE_DIR / "percentiles"
+SPLITS = [
+    "story.enter_the_nether",
+    "nether.find_bastion",
+    "nether.find_fortress",
+    "projectelo.timeline.blind_travel",
+    "story.follow_ender_eye",
+    "story.enter_the_end",
+    "completion",
+]
+# Times sorted, then by (player, time), then the same entries sorted by match id and by (player, match id)
+COLUMNS = ["time", "player", "player_time", "match_id", "match_time", "player_match_id", "player_match_time"]
+# Bumped whenever COLUMNS change, older indexes are rebuilt from scratch
+FORMAT = 2
+
+
+class PercentileIndex:
+
+    def __init__(self, path, store):
+        self.path = path
+        self.store = store
+        self.seasons = json.loads((path / "meta.json").read_text())["seasons"]
+        self._columns = {}
+
+    def columns(self, season, split):
+        key = (season, split)
+        if key not in self._columns:
+            base = self.path / str(season)
+            if (base / f"{split}.time.npy").exists():
+                self._columns[key] = {
+                    name: np.load(base / f"{split}.{name}.npy", mmap_mode="r")
+                    for name in COLUMNS
+                }
+            else:
+                self._columns[key] = None
+        return self._columns[key]
+
+    def rank(self, seasons, split, time, uuid=None, exclude=()):
+        # How many indexed times are strictly faster than `time`, and out of how many
+        seasons = [seasons] if isinstance(seasons, int) else seasons
+        exclude = np.unique(np.fromiter(exclude, dtype=np.int64))
+        placement = 0
+        length = 0
+        for season in seasons:
+            columns = self.columns(season, split)
+            if columns is None:
+                continue
+            if uuid is None:
+                times = columns["time"]
+                match_ids, match_times = columns["match_id"], columns["match_time"]
+            else:
+                player = self.store.player_codes([uuid])[0]
+                start, end = np.searchsorted(columns["player"], [player, player + 1])
+                times = columns["player_time"][start:end]
+                match_ids = columns["player_match_id"][start:end]
+                match_times = columns["player_match_time"][start:end]
+            placement += int(np.searchsorted(times, time))
+            length += len(times)
+            # Each excluded match is looked up on its own, so the query stays logarithmic in the season
+            starts = np.searchsorted(match_ids, exclude, side="left")
+            ends = np.searchsorted(match_ids, exclude, side="right")
+            for hit_start, hit_end in zip(starts.tolist(), ends.tolist()):
+                if hit_start < hit_end:
+                    placement -= int(np.count_nonzero(match_times[hit_start:hit_end] < time))
+                    length -= hit_end - hit_start
+        return placement, length
+
+    def percentile(self, seasons, split, time, uuid=None, exclude=()):
+        return percentile(*self.rank(seasons, split, time, uuid, exclude))
+
+
+def percentile(placement, length):
+    return round(placement / length * 100, 3) if length else None
+
+
+def index_path(db_name=None):
+    return PERCENTILE_DIR / (Path(db_name).stem if db_name else "default")
+
+
+def load(db_name=None):
+    store = timelines.load(db_name)
+    update(store, db_name)
+    return PercentileIndex(index_path(db_name), store)
+
+
+def update(store, db_name=None):
+    # Split times of ranked, non-decayed runs, with the latest occurrence of each split like altoid.py
+    path = index_path(db_name)
+    meta_path = path / "meta.json"
+    meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+    if meta.get("format") != FORMAT:
+        shutil.rmtree(path, ignore_errors=True)
+        meta = {"last_rowid": 0, "seasons": []}
+
+    conn, cursor = query.connect(db_name)
+    cursor.execute(
+        """
+        SELECT runs.rowid, runs.match_id, runs.player_uuid, matches.season, matches.time, matches.forfeited, matches.result_uuid
+        FROM runs JOIN matches ON matches.id = runs.match_id
+        WHERE runs.rowid > ? AND matches.type = 2 AND matches.decayed = ?
+        ORDER BY runs.rowid
+        """,
+        (meta["last_rowid"], False),
+    )
+    rows = cursor.fetchall()
+    if not rows and meta_path.exists():
+        return
+
+    if rows:
+        rowids, match_ids, uuids, seasons, times, forfeited, result_uuids = zip(*rows)
+    else:
+        rowids = match_ids = uuids = seasons = times = forfeited = result_uuids = ()
+    match_ids = np.array(match_ids, dtype=np.int64)
+    seasons = np.array(seasons, dtype=np.int64)
+    players = store.player_codes(uuids)
+    runs = store.find_runs(match_ids, uuids)
+    found = np.flatnonzero(runs >= 0)
+
+    split_times = np.full((len(runs), len(SPLITS)), np.nan)
+    positions, types, event_times = store.events(runs[found])
+    split_times[found, :-1] = splits.split_matrix(
+        positions, types, event_times, len(found), store.codes(SPLITS[:-1]), last=True
+    )
+    split_times[:, -1] = [
+        time if forfeit == False and result_uuid == uuid else np.nan
+        for time, forfeit, result_uuid, uuid in zip(times, forfeited, result_uuids, uuids)
+    ]
+
+    all_seasons = sorted(set(meta["seasons"]) | set(seasons.tolist()))
+    for season in np.unique(seasons).tolist():
+        in_season = seasons == season
+        # Runs that were re-inserted into the db replace their previous entries, even without a time
+        replaced = match_ids[in_season] * len(store.uuids) + players[in_season]
+        for i, split in enumerate(SPLITS):
+            values = split_times[in_season, i]
+            done = ~np.isnan(values) & (values != 0)
+            new = {
+                "player": players[in_season][done],
+                "time": values[done].astype(np.int64),
+                "match_id": match_ids[in_season][done],
+            }
+            _save_split(path / str(season), split, new, replaced, len(store.uuids))
+
+    path.mkdir(parents=True, exist_ok=True)
+    meta = {"last_rowid": rowids[-1] if rowids else meta["last_rowid"], "seasons": all_seasons, "format": FORMAT}
+    tmp = meta_path.with_name("meta.json.tmp")
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, meta_path)
+
+
+def _save_split(path, split, new, replaced, player_count):
+    if (path / f"{split}.time.npy").exists():
+        old = {
+            "player": np.load(path / f"{split}.player.npy"),
+            "time": np.load(path / f"{split}.player_match_time.npy"),
+            "match_id": np.load(path / f"{split}.player_match_id.npy"),
+        }
+        keep = ~np.isin(old["match_id"] * player_count + old["player"], replaced)
+        new = {name: np.concatenate([old[name][keep], new[name]]) for name in new}
+
+    by_time = np.argsort(new["time"], kind="stable")
+    by_player = np.lexsort((new["time"], new["player"]))
+    by_match = np.argsort(new["match_id"], kind="stable")
+    by_player_match = np.lexsort((new["match_id"], new["player"]))
+    columns = {
+        "time": new["time"][by_time],
+        "player": new["player"][by_player],
+        "player_time": new["time"][by_player],
+        "match_id": new["match_id"][by_match],
+        "match_time": new["time"][by_match],
+        # Same player order as "player", so its player ranges apply here too
+        "player_match_id": new["match_id"][by_player_match],
+        "player_match_time": new["time"][by_player_match],
+    }
+    path.mkdir(parents=True, exist_ok=True)
+    for name, array in columns.items():
+        tmp = path / f"{split}.{name}.tmp.npy"
+        np.save(tmp, array)
+        os.replace(tmp, path / f"{split}.{name}.npy")
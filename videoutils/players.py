@@ -0,0 +1,30 @@
+import asyncio
+import json
+import os
+
+from rankedutils import api
+
+from videoutils import avatars
+from videoutils.scheduler import Scheduler
+
+
+def write_json(path, data):
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp, path)
+
+
+async def load_players(nicks, season, assets_dir=None, scheduler=None):
+    # Repeated nicks are fetched once; avatars are linked in as {nick}.png when assets_dir is given
+    unique_nicks = list(dict.fromkeys(nicks))
+    scheduler = scheduler or Scheduler()
+    users = await asyncio.gather(
+        *[scheduler.get(api.User(nick, season=season)) for nick in unique_nicks]
+    )
+    scheduler.report()
+    users = dict(zip(unique_nicks, users))
+
+    if assets_dir is not None:
+        await avatars.save_avatars({nick: users[nick]["uuid"] for nick in unique_nicks}, assets_dir)
+    return users
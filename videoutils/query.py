@@ -0,0 +1,73 @@
+from itertools import groupby
+import sqlite3
+
+from rankedutils import db
+
+
+# Stays under SQLite's default host parameter limit
+CHUNK_SIZE = 900
+FETCH_SIZE = 10000
+# Filter columns used across the analyses; the runs index also covers the usual eloRate/player_uuid lookups
+INDEXES = [
+    ("matches", ("type", "season", "decayed")),
+    ("matches", ("bastionType", "type", "decayed")),
+    ("matches", ("seedType", "type", "decayed")),
+    ("matches", ("tag",)),
+    ("runs", ("match_id", "player_uuid", "eloRate")),
+]
+_connections = {}
+
+
+def connect(db_name=None):
+    # One connection per db file per process, with the indexes checked on first use
+    if db_name not in _connections:
+        conn, cursor = db.start(db_name) if db_name else db.start()
+        ensure_indexes(conn)
+        _connections[db_name] = conn, cursor
+    return _connections[db_name]
+
+
+def index_name(table, columns):
+    return f"idx_{table}_{'_'.join(columns)}"
+
+
+def ensure_indexes(conn):
+    for table, columns in INDEXES:
+        try:
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {index_name(table, columns)} ON {table} ({', '.join(columns)})"
+            )
+        except sqlite3.OperationalError as e:
+            # Older dbs don't have every column, anything else (e.g. a locked db) is a real failure
+            if not str(e).startswith("no such column"):
+                raise
+    conn.commit()
+
+
+def select(table, items, filters):
+    where = " AND ".join(f"{column} = ?" for column in filters)
+    return f"SELECT {items} FROM {table}" + (f" WHERE {where}" if where else ""), list(filters.values())
+
+
+def iter_query(cursor, table="matches", items="*", batch_size=FETCH_SIZE, **filters):
+    # Same filters as db.query_db, streamed in batches on a cursor of its own
+    cursor = cursor.connection.cursor()
+    cursor.execute(*select(table, items, filters))
+    while rows := cursor.fetchmany(batch_size):
+        yield from rows
+
+
+def iter_match_runs(cursor, matches, items="*", chunk_size=CHUNK_SIZE):
+    for start in range(0, len(matches), chunk_size):
+        chunk = matches[start:start + chunk_size]
+        placeholders = ", ".join("?" * len(chunk))
+        cursor.execute(
+            f"SELECT match_id, {items} FROM runs WHERE match_id IN ({placeholders}) ORDER BY match_id, rowid",
+            [match[0] for match in chunk],
+        )
+        runs = {
+            match_id: [run[1:] for run in group]
+            for match_id, group in groupby(cursor.fetchall(), key=lambda run: run[0])
+        }
+        for match in chunk:
+            yield match, runs.get(match[0], [])
@@ -0,0 +1,84 @@
+import numpy as np
+
+
+RANKS = ["coal", "iron", "gold", "emerald", "diamond", "netherite"]
+# (rank, division, lowest elo of the division)
+DIVISIONS = [
+    ("coal", 1, 0),
+    ("coal", 2, 400),
+    ("coal", 3, 500),
+    ("iron", 1, 600),
+    ("iron", 2, 700),
+    ("iron", 3, 800),
+    ("gold", 1, 900),
+    ("gold", 2, 1000),
+    ("gold", 3, 1100),
+    ("emerald", 1, 1200),
+    ("emerald", 2, 1300),
+    ("emerald", 3, 1400),
+    ("diamond", 1, 1500),
+    ("diamond", 2, 1650),
+    ("diamond", 3, 1800),
+    ("netherite", 1, 2000),
+]
+# Seasons whose boundaries differ from DIVISIONS, in the same format
+SEASON_DIVISIONS = {}
+DIVISION_LABELS = [f"{rank} {division}" for rank, division, _ in DIVISIONS]
+# No elo, or no rank in that season
+UNRANKED = -1
+
+
+class RankTable:
+
+    def __init__(self, divisions):
+        self.labels = [f"{rank} {division}" for rank, division, _ in divisions]
+        self.bounds = np.array([bound for _, _, bound in divisions], dtype=np.float64)
+        # Division code to rank code, with a trailing UNRANKED so -1 maps to itself
+        self.rank_codes = np.array([RANKS.index(rank) for rank, _, _ in divisions] + [UNRANKED], dtype=np.int64)
+
+    def divisions(self, elos):
+        elos = np.asarray(elos, dtype=np.float64)
+        codes = np.searchsorted(self.bounds, elos, side="right") - 1
+        # Missing (0, None or NaN) elos are unranked, like the old per-run checks
+        return np.where(elos > 0, codes, UNRANKED)
+
+    def ranks(self, elos):
+        return self.rank_codes[self.divisions(elos)]
+
+
+TABLES = {}
+
+
+def table(season=None):
+    if season not in TABLES:
+        TABLES[season] = RankTable(SEASON_DIVISIONS.get(season, DIVISIONS))
+    return TABLES[season]
+
+
+def elo_array(elos):
+    return np.array([np.nan if elo is None else elo for elo in elos], dtype=np.float64)
+
+
+def classify(elos, seasons=None, divisions=False):
+    # Rank (or division) codes for an array of elos, using each season's own boundaries
+    elos = np.asarray(elos, dtype=np.float64) if isinstance(elos, np.ndarray) else elo_array(elos)
+    if seasons is None or np.isscalar(seasons):
+        rank_table = table(seasons)
+        return rank_table.divisions(elos) if divisions else rank_table.ranks(elos)
+    seasons = np.asarray(seasons)
+    codes = np.full(len(elos), UNRANKED, dtype=np.int64)
+    for season in np.unique(seasons).tolist():
+        in_season = seasons == season
+        rank_table = table(season)
+        codes[in_season] = rank_table.divisions(elos[in_season]) if divisions else rank_table.ranks(elos[in_season])
+    return codes
+
+
+def rank_labels(codes):
+    return [RANKS[code] if code != UNRANKED else None for code in np.asarray(codes).tolist()]
+
+
+def division_labels(codes, seasons=None):
+    codes = np.asarray(codes).tolist()
+    seasons = [seasons] * len(codes) if seasons is None or np.isscalar(seasons) else np.asarray(seasons).tolist()
+    return [table(season).labels[code] if code != UNRANKED else None for code, season in zip(codes, seasons)]
@@ -0,0 +1,109 @@
+import asyncio
+import random
+import time
+
+import aiohttp
+from rankedutils import api
+
+
+RATE = 8
+BURST = 20
+MAX_IN_FLIGHT = 20
+MAX_RETRIES = 7
+BASE_DELAY = 5
+MAX_DELAY = 610
+RETRY_ERRORS = (api.APIRateLimitError, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class Scheduler:
+    # Token bucket that halves its rate on rate limits and creeps back up on success
+
+    def __init__(
+        self,
+        rate=RATE,
+        burst=BURST,
+        max_in_flight=MAX_IN_FLIGHT,
+        max_retries=MAX_RETRIES,
+        base_delay=BASE_DELAY,
+        max_delay=MAX_DELAY,
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.last_cut = 0
+        self.lock = asyncio.Lock()
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+
+        self.started = time.monotonic()
+        self.requests = 0
+        self.retries = 0
+        self.rate_limits = 0
+        self.failures = 0
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def backoff(self, attempt):
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    async def get(self, request):
+        for attempt in range(self.max_retries + 1):
+            await self.acquire()
+            try:
+                async with self.in_flight:
+                    response = await request.get_async()
+            except RETRY_ERRORS as e:
+                if isinstance(e, api.APIRateLimitError):
+                    self.rate_limits += 1
+                    # Requests already in flight hit the same limit, so only cut once per window
+                    if time.monotonic() - self.last_cut > self.base_delay:
+                        self.rate = max(self.rate / 2, self.max_rate / 64)
+                        self.last_cut = time.monotonic()
+                if attempt == self.max_retries:
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                delay = self.backoff(attempt)
+                print(f"{type(e).__name__} on {type(request).__name__}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            else:
+                self.requests += 1
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+                return response
+
+    async def gather(self, requests):
+        return await asyncio.gather(*[self.get(request) for request in requests])
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limits": self.rate_limits,
+            "failures": self.failures,
+            "elapsed": elapsed,
+            "throughput": self.requests / elapsed if elapsed else 0,
+            "rate": self.rate,
+        }
+
+    def report(self):
+        stats = self.stats()
+        print(
+            f"{stats['requests']} requests in {stats['elapsed']:.1f}s "
+            f"({stats['throughput']:.2f}/s, current rate {stats['rate']:.2f}/s), "
+            f"{stats['retries']} retries, {stats['rate_limits']} rate limited, {stats['failures']} failed"
+        )
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def measure(positions, types, times, run_count, entry_codes, exit_codes, reset_codes=(), death_codes=()):
+    # Segment stats for every run from flattened events as from TimelineStore.events.
+    # An entry event opens the segment (a later entry moves its start), the first exit
+    # event after it closes it, and a reset clears both. Deaths count while the segment
+    # is open. Event types are checked in the order entry, reset, death, exit.
+    positions = np.asarray(positions, dtype=np.int64)
+    times = np.asarray(times, dtype=np.int64)
+    count = len(types)
+    index = np.arange(count)
+
+    is_entry = np.isin(types, entry_codes)
+    is_reset = np.isin(types, reset_codes) & ~is_entry
+    is_death = np.isin(types, death_codes) & ~is_entry & ~is_reset
+    is_exit = np.isin(types, exit_codes) & ~is_entry & ~is_reset & ~is_death
+
+    # Each run is split into groups at its resets, state never carries across a group
+    run_start = np.ones(count, dtype=bool)
+    run_start[1:] = positions[1:] != positions[:-1]
+    group_start = np.maximum.accumulate(np.where(run_start | is_reset, index, 0))
+
+    last_entry = np.maximum.accumulate(np.where(is_entry, index, -1))
+    entry_time = np.where(last_entry >= group_start, times[np.maximum(last_entry, 0)], 0)
+    entered = entry_time != 0
+
+    candidates = np.flatnonzero(is_exit & entered)
+    _, first = np.unique(group_start[candidates], return_index=True)
+    exits = candidates[first]
+    group_exit = np.full(count, count)
+    group_exit[group_start[exits]] = exits
+    group_exit = group_exit[group_start]
+
+    deaths = np.flatnonzero(is_death & entered & (index < group_exit))
+    durations = times[exits] - entry_time[exits]
+
+    final_exit = np.zeros(run_count, dtype=np.int64)
+    still_open = np.zeros(run_count, dtype=bool)
+    if count:
+        last = np.flatnonzero(np.append(run_start[1:], True))
+        exited = group_exit[last] < count
+        final_exit[positions[last[exited]]] = times[group_exit[last[exited]]]
+        still_open[positions[last]] = entered[last] & ~exited
+
+    return {
+        "entries": np.bincount(positions[is_entry], minlength=run_count),
+        "deaths": np.bincount(positions[deaths], minlength=run_count),
+        "completions": np.bincount(positions[exits], minlength=run_count),
+        "duration": np.bincount(positions[exits], weights=durations, minlength=run_count).astype(np.int64),
+        "exit": final_exit,
+        "open": still_open,
+        # One entry per completed segment, in event order
+        "segment_runs": positions[exits],
+        "segment_times": durations,
+    }
@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def split_matrix(positions, types, times, run_count, codes, last=False, ordered=False):
+    # Time of each event type in `codes` for every run, NaN where it never happened.
+    # `positions`, `types` and `times` are flattened events as from TimelineStore.events.
+    # With `ordered`, each split is only searched for after the previous split, and
+    # with `last` the latest occurrence is taken instead of the earliest.
+    codes = np.asarray(codes, dtype=np.int64)
+    matrix = np.full((run_count, len(codes)), np.nan)
+    if not len(types) or not len(codes):
+        return matrix
+    if ordered:
+        return _ordered_matrix(matrix, positions, types, times, codes)
+
+    columns = np.full(max(int(types.max()), int(codes.max())) + 1, -1)
+    known = codes >= 0
+    columns[codes[known]] = np.flatnonzero(known)
+    event_columns = columns[types]
+    index = np.flatnonzero(event_columns >= 0)
+    if last:
+        index = index[::-1]
+    keys = positions[index] * len(codes) + event_columns[index]
+    cells, first = np.unique(keys, return_index=True)
+    matrix.flat[cells] = times[index[first]]
+    return matrix
+
+
+def _ordered_matrix(matrix, positions, types, times, codes):
+    run_count = len(matrix)
+    event_index = np.arange(len(types))
+    start = np.zeros(run_count, dtype=np.int64)
+    for column, code in enumerate(codes):
+        candidates = np.flatnonzero((types == code) & (event_index >= start[positions]))
+        runs, first = np.unique(positions[candidates], return_index=True)
+        hits = candidates[first]
+        matrix[runs, column] = times[hits]
+        start = np.full(run_count, len(types))
+        start[runs] = hits + 1
+    return matrix
+
+
+def durations(matrix):
+    # Split lengths from cumulative split times, the first split starting at 0
+    return np.diff(matrix, axis=1, prepend=0)
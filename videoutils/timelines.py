@@ -0,0 +1,211 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from videoutils import query
+from videoutils.constants import CACHE_DIR
+
+
+TIMELINE_DIR = CACHE_DIR / "timelines"
+FETCH_SIZE = 10000
+# Per-run columns plus CSR offsets into the per-event columns
+ARRAYS = ["match_id", "player", "offsets", "type", "time"]
+
+
+class TimelineStore:
+
+    def __init__(self, path, mmap_mode="r"):
+        self.path = path
+        meta = json.loads((path / "meta.json").read_text())
+        self.last_rowid = meta["last_rowid"]
+        self.event_types = meta["event_types"]
+        self.uuids = meta["uuids"]
+        self._codes = {event_type: i for i, event_type in enumerate(self.event_types)}
+        self._players = {uuid: i for i, uuid in enumerate(self.uuids)}
+        for name in ARRAYS:
+            setattr(self, name, np.load(path / f"{name}.npy", mmap_mode=mmap_mode))
+
+    def __len__(self):
+        return len(self.match_id)
+
+    def code(self, event_type):
+        return self._codes.get(event_type, -1)
+
+    def codes(self, event_types):
+        return np.array([self.code(event_type) for event_type in event_types], dtype=np.int16)
+
+    def player_codes(self, uuids):
+        return np.array([self._players.get(uuid, -1) for uuid in uuids], dtype=np.int32)
+
+    def locate(self, match_ids):
+        match_ids = np.asarray(match_ids)
+        starts = np.searchsorted(self.match_id, match_ids, side="left")
+        ends = np.searchsorted(self.match_id, match_ids, side="right")
+        return _ranges(starts, ends - starts)
+
+    def find(self, match_id, uuid):
+        player = self._players.get(uuid, -1)
+        for run in self.locate([match_id]):
+            if self.player[run] == player:
+                return run
+        return None
+
+    def find_runs(self, match_ids, uuids):
+        match_ids = np.asarray(match_ids)
+        players = self.player_codes(uuids)
+        starts = np.searchsorted(self.match_id, match_ids, side="left")
+        ends = np.searchsorted(self.match_id, match_ids, side="right")
+        runs = np.full(len(match_ids), -1, dtype=np.int64)
+        for k in range(int((ends - starts).max(initial=0))):
+            candidates = starts + k
+            hits = (candidates < ends) & (runs < 0)
+            hits[hits] = self.player[candidates[hits]] == players[hits]
+            runs[hits] = candidates[hits]
+        return runs
+
+    def length(self, run):
+        return int(self.offsets[run + 1] - self.offsets[run])
+
+    def timeline(self, match_id, uuid):
+        run = self.find(match_id, uuid)
+        if run is None:
+            return None
+        start, end = self.offsets[run], self.offsets[run + 1]
+        return self.type[start:end], self.time[start:end]
+
+    def events(self, runs):
+        # Flattened events for the given runs, with each event's position in `runs`
+        runs = np.asarray(runs, dtype=np.int64)
+        starts = self.offsets[runs]
+        lengths = self.offsets[runs + 1] - starts
+        index = _ranges(starts, lengths)
+        positions = np.repeat(np.arange(len(runs)), lengths)
+        return positions, self.type[index], self.time[index]
+
+
+def _ranges(starts, lengths):
+    lengths = np.asarray(lengths, dtype=np.int64)
+    shifts = np.repeat(np.asarray(starts, dtype=np.int64) - np.cumsum(lengths) + lengths, lengths)
+    return shifts + np.arange(lengths.sum(), dtype=np.int64)
+
+
+def store_path(db_name=None):
+    return TIMELINE_DIR / (Path(db_name).stem if db_name else "default")
+
+
+def load(db_name=None):
+    update(db_name)
+    return TimelineStore(store_path(db_name))
+
+
+def update(db_name=None):
+    path = store_path(db_name)
+    if (path / "meta.json").exists():
+        store = TimelineStore(path, mmap_mode=None)
+        last_rowid = store.last_rowid
+        event_types = list(store.event_types)
+        uuids = list(store.uuids)
+        old = {name: getattr(store, name) for name in ARRAYS}
+    else:
+        last_rowid = 0
+        event_types = []
+        uuids = []
+        old = _empty()
+
+    codes = {event_type: i for i, event_type in enumerate(event_types)}
+    players = {uuid: i for i, uuid in enumerate(uuids)}
+    match_ids = []
+    player_ids = []
+    lengths = []
+    types = []
+    times = []
+
+    conn, _ = query.connect(db_name)
+    # Own cursor so the scan doesn't clobber a caller's pending results
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT rowid, match_id, player_uuid, timeline FROM runs WHERE rowid > ? ORDER BY rowid",
+        (last_rowid,),
+    )
+    while rows := cursor.fetchmany(FETCH_SIZE):
+        for rowid, match_id, uuid, timeline in rows:
+            last_rowid = rowid
+            # Timelines are stored newest first
+            events = json.loads(timeline)[::-1] if timeline else []
+            if uuid not in players:
+                players[uuid] = len(uuids)
+                uuids.append(uuid)
+            for event in events:
+                if event["type"] not in codes:
+                    codes[event["type"]] = len(event_types)
+                    event_types.append(event["type"])
+                types.append(codes[event["type"]])
+                times.append(event["time"])
+            match_ids.append(match_id)
+            player_ids.append(players[uuid])
+            lengths.append(len(events))
+
+    if not match_ids and (path / "meta.json").exists():
+        return
+
+    new = {
+        "match_id": np.array(match_ids, dtype=np.int64),
+        "player": np.array(player_ids, dtype=np.int32),
+        "offsets": np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]),
+        "type": np.array(types, dtype=np.int16),
+        "time": np.array(times, dtype=np.int32),
+    }
+    new = _merge(old, new, len(uuids))
+
+    path.mkdir(parents=True, exist_ok=True)
+    for name in ARRAYS:
+        _save(path / f"{name}.npy", new[name])
+    meta = {"last_rowid": last_rowid, "event_types": event_types, "uuids": uuids}
+    tmp = path / "meta.json.tmp"
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, path / "meta.json")
+
+
+def _empty():
+    return {
+        "match_id": np.zeros(0, dtype=np.int64),
+        "player": np.zeros(0, dtype=np.int32),
+        "offsets": np.zeros(1, dtype=np.int64),
+        "type": np.zeros(0, dtype=np.int16),
+        "time": np.zeros(0, dtype=np.int32),
+    }
+
+
+def _merge(old, new, player_count):
+    # Rows that were re-inserted into the db replace their previous copy
+    old_keys = old["match_id"] * player_count + old["player"]
+    new_keys = new["match_id"] * player_count + new["player"]
+    keep = np.flatnonzero(~np.isin(old_keys, new_keys))
+
+    match_id = np.concatenate([old["match_id"][keep], new["match_id"]])
+    player = np.concatenate([old["player"][keep], new["player"]])
+    old_starts = old["offsets"][keep]
+    old_lengths = old["offsets"][keep + 1] - old_starts
+    new_lengths = np.diff(new["offsets"])
+    starts = np.concatenate([old_starts, new["offsets"][:-1] + len(old["type"])])
+    lengths = np.concatenate([old_lengths, new_lengths])
+    types = np.concatenate([old["type"], new["type"]])
+    times = np.concatenate([old["time"], new["time"]])
+
+    order = np.argsort(match_id, kind="stable")
+    index = _ranges(starts[order], lengths[order])
+    return {
+        "match_id": match_id[order],
+        "player": player[order],
+        "offsets": np.concatenate([[0], np.cumsum(lengths[order])]),
+        "type": types[index],
+        "time": times[index],
+    }
+
+
+def _save(path, array):
+    tmp = path.with_suffix(".tmp.npy")
+    np.save(tmp, array)
+    os.replace(tmp, path)
@@ -0,0 +1,28 @@
+import numpy as np
+
+
+def head_to_head(cursor, uuids, seasons):
+    # wins[i, j] is how many ranked matches uuids[i] won against uuids[j]
+    index = {uuid: i for i, uuid in enumerate(uuids)}
+    player_marks = ", ".join("?" * len(uuids))
+    season_marks = ", ".join("?" * len(seasons))
+    cursor.execute(
+        f"""
+        SELECT winner.player_uuid, loser.player_uuid
+        FROM matches
+        JOIN runs AS winner ON winner.match_id = matches.id AND winner.player_uuid = matches.result_uuid
+        JOIN runs AS loser ON loser.match_id = matches.id AND loser.player_uuid != matches.result_uuid
+        WHERE matches.type = 2
+        AND matches.season IN ({season_marks})
+        AND winner.player_uuid IN ({player_marks})
+        AND loser.player_uuid IN ({player_marks})
+        """,
+        [*seasons, *uuids, *uuids],
+    )
+    pairs = np.array(
+        [(index[winner], index[loser]) for winner, loser in cursor.fetchall()],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    wins = np.zeros((len(uuids), len(uuids)), dtype=np.int64)
+    np.add.at(wins, (pairs[:, 0], pairs[:, 1]), 1)
+    return wins